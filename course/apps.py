@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CourseConfig(AppConfig):
     name = 'course'
+
+    def ready(self):
+        import course.images
+        import course.stats
@@ -0,0 +1,18 @@
+def vtt_timestamp(seconds):
+    millis = round(seconds * 1000)
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    seconds, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+def to_webvtt(segments):
+    """Render transcript segments as a WebVTT caption file."""
+    cues = ["WEBVTT", ""]
+    for segment in segments:
+        # a blank line ends a cue, and "-->" would start a new timing line
+        text = " ".join(segment["text"].split()).replace("-->", "->")
+        if not text:
+            continue
+        cues += [f"{vtt_timestamp(segment['start'])} --> {vtt_timestamp(segment['end'])}", text, ""]
+    return "\n".join(cues)
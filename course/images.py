@@ -0,0 +1,126 @@
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .jobs import enqueue_image_derivatives
+
+
+# Responsive copies of uploaded images, written beside the original as
+# <stem>.<width>w.webp and .jpg. Cards and avatars then fetch a few tens of
+# KB instead of the multi-MB photo that was uploaded.
+
+WIDTHS = (160, 320, 640, 1280)
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+ORIENTATION = 0x0112
+# what generate() writes last, so its presence means the set is complete
+LAST_FORMAT = "jpg"
+
+CACHE_PREFIX = "image_derivatives:"
+# names never change for a given upload, so found sets can stay cached;
+# "not there yet" is only remembered until the job has likely finished
+CACHE_TIMEOUT = 7 * 24 * 60 * 60
+MISSING_TIMEOUT = 60
+
+# models whose images get derivatives, by label
+IMAGE_FIELDS = {
+    "course.Course": "cover_img",
+    "people.UserProfile": "picture",
+    "people.Status": "image",
+}
+
+
+def derivative_name(name, width, extension):
+    path = PurePosixPath(name)
+    return str(path.with_name(f"{path.stem}.{width}w.{extension}"))
+
+
+def widths_for(width):
+    """The widths to make for an image ``width`` pixels wide; never upscaled."""
+    return sorted({min(size, width) for size in WIDTHS})
+
+
+def _manifest(name, widths):
+    return {
+        extension: [(width, derivative_name(name, width, extension)) for width in widths]
+        for extension in FORMATS
+    }
+
+
+def _on_disk(name, storage):
+    try:
+        # only the header is read to get the size
+        with storage.open(name) as file, Image.open(file) as image:
+            width, height = image.size
+            if image.getexif().get(ORIENTATION) in (5, 6, 7, 8):
+                # stored a quarter turn from how it is shown
+                width = height
+    except (OSError, UnidentifiedImageError):
+        return {}
+    manifest = _manifest(name, widths_for(width))
+    _, last = manifest[LAST_FORMAT][-1]
+    return manifest if storage.exists(last) else {}
+
+
+def derivatives(name, storage=default_storage):
+    """
+    ``{"webp": [(width, name), ...], "jpg": [...]}`` for an uploaded image,
+    or ``{}`` until they have been made. Cached, so templates pay a cache
+    lookup per image rather than a look at the files.
+    """
+    key = CACHE_PREFIX + name
+    found = cache.get(key)
+    if found is None:
+        found = _on_disk(name, storage)
+        cache.set(key, found, CACHE_TIMEOUT if found else MISSING_TIMEOUT)
+    return found
+
+
+def _encode(image, options):
+    buffer = BytesIO()
+    # no exif= is passed, so camera, GPS and orientation tags are dropped
+    image.save(buffer, **options)
+    return buffer.getvalue()
+
+
+def generate(name, storage=default_storage):
+    """Write the WebP and JPEG derivatives of ``name`` and cache their manifest."""
+    with storage.open(name) as file, Image.open(file) as image:
+        # decode large JPEGs at a reduced scale: far faster, and still at
+        # least as large as the biggest derivative
+        image.draft("RGB", (WIDTHS[-1], WIDTHS[-1]))
+        alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = ImageOps.exif_transpose(image).convert("RGBA" if alpha else "RGB")
+    opaque = image
+    if alpha:
+        opaque = Image.new("RGB", image.size, "white")
+        opaque.paste(image, mask=image.getchannel("A"))
+
+    manifest = _manifest(name, widths_for(image.width))
+    for extension in sorted(FORMATS, key=lambda extension: extension == LAST_FORMAT):
+        source = opaque if FORMATS[extension]["format"] == "JPEG" else image
+        for width, target in manifest[extension]:
+            height = max(1, round(source.height * width / source.width))
+            resized = source if width == source.width else source.resize((width, height), Image.Resampling.LANCZOS)
+            storage.delete(target)
+            storage.save(target, ContentFile(_encode(resized, FORMATS[extension])))
+    cache.set(CACHE_PREFIX + name, manifest, CACHE_TIMEOUT)
+    return manifest
+
+
+def queue_derivatives(sender, instance, raw=False, **kwargs):
+    image = getattr(instance, IMAGE_FIELDS[sender._meta.label])
+    if raw or not image or derivatives(image.name):
+        return
+    enqueue_image_derivatives(image.name)
+
+
+for label in IMAGE_FIELDS:
+    post_save.connect(queue_derivatives, sender=label, dispatch_uid=f"image_derivatives:{label}")
@@ -0,0 +1,179 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+from functools import cache
+
+from celery import current_app
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from .models import BackgroundJob, VideoMaterial
+
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBE_TASK = "course.transcribe"
+TRANSCODE_TASK = "course.transcode"
+PREVIEWS_TASK = "course.video_previews"
+IMAGES_TASK = "course.image_derivatives"
+# broker priorities run 0 (first) to 9
+LOWEST_PRIORITY = 9
+
+
+class CeleryBackend:
+    """Hand tasks to the Celery broker by name."""
+    def enqueue(self, task, kwargs, priority=0):
+        return current_app.send_task(task, kwargs=kwargs, priority=priority)
+
+
+class LocalBackend:
+    """
+    Broker-less backend for standalone installs. Jobs are rows in
+    ``BackgroundJob`` so they survive a restart, and a bounded pool of
+    daemon threads in this process runs them by Celery task name, off the
+    request threads. Assumes a single server process, as standalone mode
+    does.
+
+    Workers start with the first job a process enqueues and then also pick
+    up whatever an earlier process left queued; ``manage.py run_jobs``
+    drains the queue without waiting for that. Jobs still marked running
+    are only taken back once their lease has run out, since the process
+    running them may well still be alive.
+    """
+    max_attempts = 3
+    poll_seconds = 5
+    # longer than any task's time_limit (course.transcode's is 2h05m)
+    lease = timedelta(hours=3)
+
+    def __init__(self, workers=None):
+        self.workers = workers or settings.LOCAL_TASK_WORKERS
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def enqueue(self, task, kwargs, priority=0):
+        job = BackgroundJob.objects.create(task=task, kwargs=kwargs, priority=priority)
+        # start workers only once the job is visible to their connections
+        transaction.on_commit(self.start)
+        return job
+
+    def start(self):
+        with self.lock:
+            if not self.threads:
+                self.requeue_abandoned()
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self.work, name=f"local-jobs-{i}", daemon=True)
+                    thread.start()
+                    self.threads.append(thread)
+        self.wakeup.set()
+
+    def requeue_abandoned(self):
+        """Queue again the jobs a process stopped while running them."""
+        return BackgroundJob.objects.filter(
+            status=BackgroundJob.Status.RUNNING, started_at__lt=now() - self.lease
+        ).update(status=BackgroundJob.Status.QUEUED)
+
+    def claim(self):
+        queued = BackgroundJob.objects.filter(status=BackgroundJob.Status.QUEUED)
+        for job in queued.order_by("priority", "id")[:self.workers + 1]:
+            # another thread may have taken it since the SELECT
+            if queued.filter(id=job.id).update(
+                status=BackgroundJob.Status.RUNNING, started_at=now(), attempts=F("attempts") + 1
+            ):
+                job.refresh_from_db()
+                return job
+        return None
+
+    def run(self, job):
+        if job.task not in current_app.tasks:
+            # task modules are only autodiscovered when a worker boots
+            current_app.loader.import_default_modules()
+        result = current_app.tasks[job.task].apply(kwargs=job.kwargs)
+        if result.successful():
+            job.status, job.error = BackgroundJob.Status.DONE, ""
+        else:
+            job.error = result.traceback or repr(result.result)
+            retry = job.attempts < self.max_attempts
+            job.status = BackgroundJob.Status.QUEUED if retry else BackgroundJob.Status.FAILED
+            logger.warning("Job %s (%s) failed, attempt %s", job.id, job.task, job.attempts)
+        job.finished_at = now()
+        job.save(update_fields=["status", "error", "finished_at"])
+
+    def drain(self):
+        """Run queued jobs in the calling thread until none are left."""
+        while (job := self.claim()) is not None:
+            try:
+                self.run(job)
+            except Exception:
+                BackgroundJob.objects.filter(id=job.id).update(
+                    status=BackgroundJob.Status.FAILED, error=traceback.format_exc(), finished_at=now()
+                )
+            finally:
+                close_old_connections()
+
+    def work(self):
+        while True:
+            self.drain()
+            self.wakeup.wait(self.poll_seconds)
+            self.wakeup.clear()
+
+
+@cache
+def get_backend():
+    return import_string(settings.TASK_BACKEND)()
+
+
+def enqueue(task, kwargs, priority=0):
+    return get_backend().enqueue(task, kwargs, priority=priority)
+
+
+def enqueue_transcription(video_id):
+    """
+    Queue a transcription by task name on the configured backend. Importing
+    ``course.tasks`` here would drag whisper's dependencies into web
+    processes that, with Celery, never run it.
+
+    Each video queued behind others of the same course drops one priority
+    step, so one instructor's batch upload interleaves with other courses
+    instead of holding the queue.
+    """
+    videos = VideoMaterial.objects.filter(id=video_id)
+    course_id = videos.values_list("material__module__course_id", flat=True).first()
+    queued = (
+        VideoMaterial.objects
+        .filter(
+            material__module__course_id=course_id,
+            transcript_status__in=[
+                VideoMaterial.TranscriptStatus.PENDING,
+                VideoMaterial.TranscriptStatus.BATCHED,
+                VideoMaterial.TranscriptStatus.RUNNING,
+            ],
+        )
+        .exclude(id=video_id)
+        .count()
+    )
+    videos.update(
+        transcript_status=VideoMaterial.TranscriptStatus.PENDING,
+        transcript_chunks=0,
+        transcript_chunks_done=0,
+    )
+    return enqueue(TRANSCRIBE_TASK, {"video_id": video_id}, priority=min(queued, LOWEST_PRIORITY))
+
+
+def enqueue_transcoding(video_id):
+    """Queue the HLS encode of a video by task name, like transcription."""
+    return enqueue(TRANSCODE_TASK, {"video_id": video_id})
+
+
+def enqueue_previews(video_id):
+    """Queue a new upload's probe, poster and scrub sprites by task name."""
+    return enqueue(PREVIEWS_TASK, {"video_id": video_id})
+
+
+def enqueue_image_derivatives(name):
+    """Queue the responsive sizes of an uploaded image by task name."""
+    return enqueue(IMAGES_TASK, {"name": name})
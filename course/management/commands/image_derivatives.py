@@ -0,0 +1,40 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from course.images import IMAGE_FIELDS, derivatives, generate
+from course.jobs import enqueue_image_derivatives
+
+
+class Command(BaseCommand):
+    help = "Make the responsive sizes of images uploaded before they were generated on save."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--enqueue",
+            action="store_true",
+            help="Queue them for the workers instead of making them here.",
+        )
+
+    def handle(self, *args, **options):
+        made = failed = 0
+        for label, field in IMAGE_FIELDS.items():
+            names = (
+                apps.get_model(label).objects
+                .exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+                .values_list(field, flat=True).distinct()
+            )
+            for name in names.iterator():
+                if derivatives(name):
+                    continue
+                if options["enqueue"]:
+                    enqueue_image_derivatives(name)
+                    made += 1
+                    continue
+                try:
+                    generate(name)
+                    made += 1
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+        verb = "Queued" if options["enqueue"] else "Made"
+        self.stdout.write(f"{verb} derivatives for {made} images, {failed} failed.")
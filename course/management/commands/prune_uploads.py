@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from course.models import ResumableUpload
+from course.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads that were abandoned before being finalized, and their partial files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=24,
+            help="Prune uploads not sent a piece for this long.",
+        )
+
+    def handle(self, *args, **options):
+        stale = ResumableUpload.objects.filter(updated_at__lt=now() - timedelta(hours=options["hours"]))
+        count = 0
+        for upload in stale.iterator():
+            discard_upload(upload)
+            count += 1
+        self.stdout.write(f"Pruned {count} abandoned uploads.")
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+# published-only external content indexes over course_course
+COURSE_INDEXES = ["courses_fts", "courses_trigram_fts"]
+INDEXES = COURSE_INDEXES + ["course_content_fts"]
+
+
+class Command(BaseCommand):
+    help = "Rebuild the course search indexes from published courses and merge FTS5 segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-rebuild",
+            action="store_true",
+            help="Skip repopulating the course indexes, only optimize/merge.",
+        )
+        parser.add_argument(
+            "--merge",
+            type=int,
+            metavar="PAGES",
+            help="Run an incremental merge of up to PAGES pages instead of a full optimize.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not options["no_rebuild"]:
+                for table in COURSE_INDEXES:
+                    cursor.execute(f"INSERT INTO {table}({table}) VALUES ('delete-all')")
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {table}(rowid, title, description)
+                        SELECT id, title, description FROM course_course WHERE status = 'published'
+                        """
+                    )
+                    self.stdout.write(f"{table}: indexed {cursor.rowcount} published courses")
+
+            for table in INDEXES:
+                before = self.segment_count(cursor, table)
+                if options["merge"]:
+                    cursor.execute(
+                        f"INSERT INTO {table}({table}, rank) VALUES ('merge', %s)",
+                        [options["merge"]],
+                    )
+                else:
+                    cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+                after = self.segment_count(cursor, table)
+                self.stdout.write(f"{table}: {before} -> {after} segments")
+
+    def segment_count(self, cursor, table):
+        cursor.execute(f"SELECT count(DISTINCT segid) FROM {table}_idx")
+        return cursor.fetchone()[0]
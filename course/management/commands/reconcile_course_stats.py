@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from course.models import Course, CourseStats
+from course.stats import STAT_FIELDS, compute_stats
+
+
+class Command(BaseCommand):
+    help = "Recount course statistics from ratings, enrollments and materials and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of courses recounted per round of queries.",
+        )
+
+    def handle(self, *args, **options):
+        course_ids = list(Course.objects.order_by("id").values_list("id", flat=True))
+        batch_size = options["batch_size"]
+        created = fixed = 0
+
+        for start in range(0, len(course_ids), batch_size):
+            batch = course_ids[start:start + batch_size]
+            with transaction.atomic():
+                expected = compute_stats(batch)
+                existing = CourseStats.objects.select_for_update().in_bulk(batch)
+
+                drifted = []
+                for course_id, values in expected.items():
+                    row = existing.get(course_id)
+                    if row is None:
+                        continue
+                    if any(not self.same(getattr(row, f), values[f]) for f in STAT_FIELDS):
+                        for field, value in values.items():
+                            setattr(row, field, value)
+                        drifted.append(row)
+                missing = [
+                    CourseStats(course_id=course_id, **values)
+                    for course_id, values in expected.items()
+                    if course_id not in existing
+                ]
+                CourseStats.objects.bulk_update(drifted, STAT_FIELDS)
+                CourseStats.objects.bulk_create(missing)
+                fixed += len(drifted)
+                created += len(missing)
+
+        self.stdout.write(
+            f"Checked {len(course_ids)} courses: {fixed} fixed, {created} created"
+        )
+
+    @staticmethod
+    def same(current, expected):
+        if isinstance(expected, float) and current is not None:
+            return abs(current - expected) < 1e-9
+        return current == expected
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from course.jobs import LocalBackend
+from course.models import BackgroundJob
+
+
+class Command(BaseCommand):
+    help = "Run the background jobs queued in the database (standalone mode) in the foreground."
+
+    def handle(self, *args, **options):
+        backend = LocalBackend(workers=1)
+        # not the jobs the server may still be running next to us
+        backend.requeue_abandoned()
+        backend.drain()
+        counts = {
+            status: BackgroundJob.objects.filter(status=status).count()
+            for status in BackgroundJob.Status.values
+        }
+        self.stdout.write(", ".join(f"{count} {status}" for status, count in counts.items()))
@@ -0,0 +1,186 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from celery import current_app
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from course.jobs import enqueue_transcription
+from course.models import VideoMaterial
+from course.uploads import file_sha256
+
+Status = VideoMaterial.TranscriptStatus
+
+
+class Command(BaseCommand):
+    help = (
+        "Transcribe every video that has no transcript yet. Progress is kept on the "
+        "videos themselves, so an interrupted run picks up where it stopped; pass "
+        "--resume to also restart the videos it was in the middle of."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Videos transcribed at the same time. In this process they take turns at "
+                 "inference; with --enqueue, each goes to a free worker.",
+        )
+        parser.add_argument(
+            "--enqueue",
+            action="store_true",
+            help="Hand videos to the task backend, at most --workers at a time, instead of "
+                 "transcribing in this process.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry videos whose last transcription failed.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="First reset videos left queued, batched or transcribing, as an interrupted "
+                 "run leaves them, so they are transcribed again. Don't use it while workers "
+                 "are still transcribing.",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=5,
+            help="Seconds between status checks with --enqueue.",
+        )
+
+    def handle(self, *args, **options):
+        if options["resume"]:
+            # nothing will finish these if the run that started them was
+            # killed; reset rather than pick them up as they are, or a batch
+            # would claim clips whose audio was never extracted
+            VideoMaterial.objects.filter(
+                transcript="", transcript_status__in=[Status.PENDING, Status.BATCHED, Status.RUNNING]
+            ).update(transcript_status=Status.NONE, transcript_chunks=0, transcript_chunks_done=0)
+        statuses = [Status.NONE, Status.FAILED] if options["retry_failed"] else [Status.NONE]
+        videos = list(
+            VideoMaterial.objects
+            .filter(transcript="", transcript_status__in=statuses)
+            .exclude(path="")
+            .order_by("id")
+            .only("id", "path", "content_hash")
+        )
+        # one transcription per distinct file; copies get the result after
+        self.copies = {}
+        leaders = []
+        for video in videos:
+            content_hash = self.hash(video)
+            if content_hash is None:
+                continue
+            if content_hash in self.copies:
+                self.copies[content_hash].append(video.id)
+            else:
+                self.copies[content_hash] = []
+                leaders.append(video)
+
+        self.total = len(leaders)
+        self.done = self.failed = 0
+        self.started = time.monotonic()
+        self.stdout.write(
+            f"{len(videos)} videos without a transcript, {self.total} distinct files to transcribe"
+        )
+        if options["enqueue"]:
+            self.enqueue(leaders, options["workers"], options["poll"])
+        else:
+            self.run_here(leaders, options["workers"])
+        self.stdout.write(f"Finished: {self.done} transcribed, {self.failed} failed")
+
+    def hash(self, video):
+        if video.content_hash:
+            return video.content_hash
+        try:
+            video.content_hash = file_sha256(video.path.path)
+        except OSError as exc:
+            self.stderr.write(f"Skipping video {video.id}: {exc}")
+            return None
+        VideoMaterial.objects.filter(id=video.id).update(content_hash=video.content_hash)
+        return video.content_hash
+
+    def run_here(self, leaders, workers):
+        from course import transcription
+        from course.tasks import transcribe
+
+        def run(video_id):
+            try:
+                result = transcribe.apply(kwargs={"video_id": video_id})
+                if result.failed():
+                    # not something to wait for; transcribe may have raised
+                    # before it could mark the video
+                    self.stderr.write(f"Video {video_id} failed: {result.result!r}")
+                    VideoMaterial.objects.filter(id=video_id).update(transcript_status=Status.FAILED)
+                    return
+                # a short clip may have been picked up by another thread's batch
+                videos = VideoMaterial.objects.filter(id=video_id)
+                while videos.filter(transcript_status__in=[Status.BATCHED, Status.RUNNING]).exists():
+                    time.sleep(1)
+            finally:
+                close_old_connections()
+
+        # transcribe runs inline in each thread. The threads share one model,
+        # loaded before they start, and take turns at inference, so each
+        # inference gets every core; what overlaps is the audio extraction
+        # and silence splitting. --enqueue spreads inference over workers.
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        try:
+            if leaders:
+                transcription.preload(["celery"])
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(run, video.id): video for video in leaders}
+                for future in as_completed(futures):
+                    future.result()
+                    self.finished(futures[future])
+        finally:
+            current_app.conf.task_always_eager = eager
+
+    def enqueue(self, leaders, workers, poll):
+        waiting = list(reversed(leaders))
+        in_flight = {}
+        while waiting or in_flight:
+            while waiting and len(in_flight) < workers:
+                video = waiting.pop()
+                enqueue_transcription(video.id)
+                in_flight[video.id] = video
+            time.sleep(poll)
+            settled = list(VideoMaterial.objects.filter(
+                id__in=in_flight, transcript_status__in=[Status.DONE, Status.FAILED]
+            ).values_list("id", flat=True))
+            for video_id in settled:
+                self.finished(in_flight.pop(video_id))
+
+    def finished(self, video):
+        row = VideoMaterial.objects.only(
+            "transcript_status", "transcript", "segments", "transcribed_at"
+        ).get(id=video.id)
+        copies = self.copies[video.content_hash]
+        if row.transcript_status == Status.DONE:
+            self.done += 1
+            VideoMaterial.objects.filter(id__in=copies).update(
+                transcript=row.transcript,
+                segments=row.segments,
+                transcribed_at=row.transcribed_at,
+                transcript_status=Status.DONE,
+            )
+        else:
+            self.failed += 1
+
+        finished = self.done + self.failed
+        elapsed = time.monotonic() - self.started
+        rate = finished / elapsed
+        eta = timedelta(seconds=round((self.total - finished) / rate)) if rate else "?"
+        outcome = row.transcript_status
+        if copies and outcome == Status.DONE:
+            outcome += f", copied to {len(copies)} duplicates"
+        self.stdout.write(
+            f"[{finished}/{self.total}] video {video.id} {outcome} - "
+            f"{rate * 60:.2f} videos/min, ETA {eta}"
+        )
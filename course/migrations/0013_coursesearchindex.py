@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:04
+
+import course.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0012_videomaterial_transcript'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSearchIndex',
+            fields=[
+                ('course', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='course.course')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('document', course.search.FTS5Field(db_column='courses_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'courses_fts',
+                'managed': False,
+            },
+        ),
+        # make the hidden `rank` column use the weights the views used to pass to bm25()
+        migrations.RunSQL(
+            sql="INSERT INTO courses_fts(courses_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)');",
+            reverse_sql="INSERT INTO courses_fts(courses_fts, rank) VALUES ('rank', 'bm25()');",
+        ),
+    ]
@@ -0,0 +1,175 @@
+# Generated by Django 6.0.2 on 2026-10-17 07:12
+
+import course.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# One index row per module name, material name, reading text and video
+# transcript. Rowids are `source id * 4 + kind` so each trigger can find its
+# own row without scanning the index:
+#   0 = module, 1 = material, 2 = reading, 3 = video
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0013_coursesearchindex'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE VIRTUAL TABLE course_content_fts USING fts5(
+                    course_id UNINDEXED,
+                    body,
+                    tokenize='porter unicode61'
+                );
+                """,
+                """
+                INSERT INTO course_content_fts(rowid, course_id, body)
+                SELECT id * 4, course_id, name FROM course_module;
+                """,
+                """
+                INSERT INTO course_content_fts(rowid, course_id, body)
+                SELECT mat.id * 4 + 1, m.course_id, mat.name
+                FROM course_material mat JOIN course_module m ON m.id = mat.module_id;
+                """,
+                """
+                INSERT INTO course_content_fts(rowid, course_id, body)
+                SELECT r.id * 4 + 2, m.course_id, r.text
+                FROM course_readingmaterial r
+                JOIN course_material mat ON mat.id = r.material_id
+                JOIN course_module m ON m.id = mat.module_id
+                WHERE r.text != '';
+                """,
+                """
+                INSERT INTO course_content_fts(rowid, course_id, body)
+                SELECT v.id * 4 + 3, m.course_id, v.transcript
+                FROM course_videomaterial v
+                JOIN course_material mat ON mat.id = v.material_id
+                JOIN course_module m ON m.id = mat.module_id
+                WHERE v.transcript != '';
+                """,
+                # modules
+                """
+                CREATE TRIGGER course_module_content_ai AFTER INSERT ON course_module BEGIN
+                    INSERT INTO course_content_fts(rowid, course_id, body)
+                    VALUES (new.id * 4, new.course_id, new.name);
+                END;
+                """,
+                """
+                CREATE TRIGGER course_module_content_au AFTER UPDATE OF name, course_id ON course_module
+                WHEN old.name IS NOT new.name OR old.course_id IS NOT new.course_id BEGIN
+                    DELETE FROM course_content_fts WHERE rowid = old.id * 4;
+                    INSERT INTO course_content_fts(rowid, course_id, body)
+                    VALUES (new.id * 4, new.course_id, new.name);
+                END;
+                """,
+                """
+                CREATE TRIGGER course_module_content_ad AFTER DELETE ON course_module BEGIN
+                    DELETE FROM course_content_fts WHERE rowid = old.id * 4;
+                END;
+                """,
+                # materials
+                """
+                CREATE TRIGGER course_material_content_ai AFTER INSERT ON course_material BEGIN
+                    INSERT INTO course_content_fts(rowid, course_id, body)
+                    SELECT new.id * 4 + 1, course_id, new.name FROM course_module WHERE id = new.module_id;
+                END;
+                """,
+                """
+                CREATE TRIGGER course_material_content_au AFTER UPDATE OF name, module_id ON course_material
+                WHEN old.name IS NOT new.name OR old.module_id IS NOT new.module_id BEGIN
+                    DELETE FROM course_content_fts WHERE rowid = old.id * 4 + 1;
+                    INSERT INTO course_content_fts(rowid, course_id, body)
+                    SELECT new.id * 4 + 1, course_id, new.name FROM course_module WHERE id = new.module_id;
+                END;
+                """,
+                """
+                CREATE TRIGGER course_material_content_ad AFTER DELETE ON course_material BEGIN
+                    DELETE FROM course_content_fts WHERE rowid = old.id * 4 + 1;
+                END;
+                """,
+                # readings
+                """
+                CREATE TRIGGER course_reading_content_ai AFTER INSERT ON course_readingmaterial
+                WHEN new.text != '' BEGIN
+                    INSERT INTO course_content_fts(rowid, course_id, body)
+                    SELECT new.id * 4 + 2, m.course_id, new.text
+                    FROM course_material mat JOIN course_module m ON m.id = mat.module_id
+                    WHERE mat.id = new.material_id;
+                END;
+                """,
+                """
+                CREATE TRIGGER course_reading_content_au AFTER UPDATE OF text, material_id ON course_readingmaterial
+                WHEN old.text IS NOT new.text OR old.material_id IS NOT new.material_id BEGIN
+                    DELETE FROM course_content_fts WHERE rowid = old.id * 4 + 2;
+                    INSERT INTO course_content_fts(rowid, course_id, body)
+                    SELECT new.id * 4 + 2, m.course_id, new.text
+                    FROM course_material mat JOIN course_module m ON m.id = mat.module_id
+                    WHERE mat.id = new.material_id AND new.text != '';
+                END;
+                """,
+                """
+                CREATE TRIGGER course_reading_content_ad AFTER DELETE ON course_readingmaterial BEGIN
+                    DELETE FROM course_content_fts WHERE rowid = old.id * 4 + 2;
+                END;
+                """,
+                # videos: only re-index when the transcript actually changes,
+                # so a transcript landing touches exactly one index row
+                """
+                CREATE TRIGGER course_video_content_ai AFTER INSERT ON course_videomaterial
+                WHEN new.transcript != '' BEGIN
+                    INSERT INTO course_content_fts(rowid, course_id, body)
+                    SELECT new.id * 4 + 3, m.course_id, new.transcript
+                    FROM course_material mat JOIN course_module m ON m.id = mat.module_id
+                    WHERE mat.id = new.material_id;
+                END;
+                """,
+                """
+                CREATE TRIGGER course_video_content_au AFTER UPDATE OF transcript, material_id ON course_videomaterial
+                WHEN old.transcript IS NOT new.transcript OR old.material_id IS NOT new.material_id BEGIN
+                    DELETE FROM course_content_fts WHERE rowid = old.id * 4 + 3;
+                    INSERT INTO course_content_fts(rowid, course_id, body)
+                    SELECT new.id * 4 + 3, m.course_id, new.transcript
+                    FROM course_material mat JOIN course_module m ON m.id = mat.module_id
+                    WHERE mat.id = new.material_id AND new.transcript != '';
+                END;
+                """,
+                """
+                CREATE TRIGGER course_video_content_ad AFTER DELETE ON course_videomaterial BEGIN
+                    DELETE FROM course_content_fts WHERE rowid = old.id * 4 + 3;
+                END;
+                """,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS course_video_content_ad;",
+                "DROP TRIGGER IF EXISTS course_video_content_au;",
+                "DROP TRIGGER IF EXISTS course_video_content_ai;",
+                "DROP TRIGGER IF EXISTS course_reading_content_ad;",
+                "DROP TRIGGER IF EXISTS course_reading_content_au;",
+                "DROP TRIGGER IF EXISTS course_reading_content_ai;",
+                "DROP TRIGGER IF EXISTS course_material_content_ad;",
+                "DROP TRIGGER IF EXISTS course_material_content_au;",
+                "DROP TRIGGER IF EXISTS course_material_content_ai;",
+                "DROP TRIGGER IF EXISTS course_module_content_ad;",
+                "DROP TRIGGER IF EXISTS course_module_content_au;",
+                "DROP TRIGGER IF EXISTS course_module_content_ai;",
+                "DROP TABLE IF EXISTS course_content_fts;",
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseContentIndex',
+            fields=[
+                ('id', models.BigIntegerField(db_column='rowid', primary_key=True, serialize=False)),
+                ('body', models.TextField()),
+                ('document', course.search.FTS5Field(db_column='course_content_fts')),
+                ('rank', models.FloatField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='content_index', to='course.course')),
+            ],
+            options={
+                'db_table': 'course_content_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 6.0.2 on 2026-10-17 08:30
+
+from django.db import migrations
+
+
+# courses_fts is an external content table, so a 'delete' must only ever be
+# issued for rows that were actually indexed. Every statement below is
+# guarded on the status the row had when it was (or was not) indexed.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("course", "0014_content_fts"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "DROP TRIGGER IF EXISTS courses_au;",
+                "DROP TRIGGER IF EXISTS courses_ad;",
+                "DROP TRIGGER IF EXISTS courses_ai;",
+                """
+                CREATE TRIGGER courses_ai AFTER INSERT ON course_course
+                WHEN new.status = 'published' BEGIN
+                    INSERT INTO courses_fts(rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END;
+                """,
+                """
+                CREATE TRIGGER courses_ad AFTER DELETE ON course_course
+                WHEN old.status = 'published' BEGIN
+                    INSERT INTO courses_fts(courses_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END;
+                """,
+                """
+                CREATE TRIGGER courses_au AFTER UPDATE OF title, description, status ON course_course
+                WHEN old.title IS NOT new.title
+                  OR old.description IS NOT new.description
+                  OR old.status IS NOT new.status BEGIN
+                    INSERT INTO courses_fts(courses_fts, rowid, title, description)
+                    SELECT 'delete', old.id, old.title, old.description
+                    WHERE old.status = 'published';
+                    INSERT INTO courses_fts(rowid, title, description)
+                    SELECT new.id, new.title, new.description
+                    WHERE new.status = 'published';
+                END;
+                """,
+                # drop the drafts the old triggers indexed
+                "INSERT INTO courses_fts(courses_fts) VALUES ('delete-all');",
+                """
+                INSERT INTO courses_fts(rowid, title, description)
+                SELECT id, title, description FROM course_course WHERE status = 'published';
+                """,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS courses_au;",
+                "DROP TRIGGER IF EXISTS courses_ad;",
+                "DROP TRIGGER IF EXISTS courses_ai;",
+                """
+                CREATE TRIGGER courses_ai AFTER INSERT ON course_course BEGIN
+                    INSERT INTO courses_fts(rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END;
+                """,
+                """
+                CREATE TRIGGER courses_ad AFTER DELETE ON course_course BEGIN
+                    INSERT INTO courses_fts(courses_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END;
+                """,
+                """
+                CREATE TRIGGER courses_au AFTER UPDATE ON course_course BEGIN
+                    INSERT INTO courses_fts(courses_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO courses_fts(rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END;
+                """,
+                "INSERT INTO courses_fts(courses_fts) VALUES ('rebuild');",
+            ],
+        )
+    ]
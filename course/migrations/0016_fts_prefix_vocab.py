@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:05
+
+from django.db import migrations
+
+
+# Prefix indexes can only be declared when an FTS5 table is created, so
+# courses_fts is recreated with prefix='2 3' for the typeahead endpoint. The
+# triggers from 0015 refer to the table by name and keep working.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("course", "0015_published_only_fts"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "DROP TABLE courses_fts;",
+                """
+                CREATE VIRTUAL TABLE courses_fts USING fts5(
+                    title,
+                    description,
+                    content='course_course',
+                    content_rowid='id',
+                    prefix='2 3'
+                );
+                """,
+                "INSERT INTO courses_fts(courses_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)');",
+                """
+                INSERT INTO courses_fts(rowid, title, description)
+                SELECT id, title, description FROM course_course WHERE status = 'published';
+                """,
+                "CREATE VIRTUAL TABLE courses_fts_vocab USING fts5vocab(courses_fts, row);",
+            ],
+            reverse_sql=[
+                "DROP TABLE IF EXISTS courses_fts_vocab;",
+                "DROP TABLE courses_fts;",
+                """
+                CREATE VIRTUAL TABLE courses_fts USING fts5(
+                    title,
+                    description,
+                    content='course_course',
+                    content_rowid='id'
+                );
+                """,
+                "INSERT INTO courses_fts(courses_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)');",
+                """
+                INSERT INTO courses_fts(rowid, title, description)
+                SELECT id, title, description FROM course_course WHERE status = 'published';
+                """,
+            ],
+        )
+    ]
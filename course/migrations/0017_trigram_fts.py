@@ -0,0 +1,82 @@
+# Generated by Django 6.0.2 on 2026-10-17 10:20
+
+import course.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Trigram companion to courses_fts used for typo-tolerant fallback search.
+# Same published-only rules as the triggers in 0015.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0016_fts_prefix_vocab'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE VIRTUAL TABLE courses_trigram_fts USING fts5(
+                    title,
+                    description,
+                    content='course_course',
+                    content_rowid='id',
+                    tokenize='trigram'
+                );
+                """,
+                "INSERT INTO courses_trigram_fts(courses_trigram_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)');",
+                """
+                INSERT INTO courses_trigram_fts(rowid, title, description)
+                SELECT id, title, description FROM course_course WHERE status = 'published';
+                """,
+                """
+                CREATE TRIGGER courses_trigram_ai AFTER INSERT ON course_course
+                WHEN new.status = 'published' BEGIN
+                    INSERT INTO courses_trigram_fts(rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END;
+                """,
+                """
+                CREATE TRIGGER courses_trigram_ad AFTER DELETE ON course_course
+                WHEN old.status = 'published' BEGIN
+                    INSERT INTO courses_trigram_fts(courses_trigram_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END;
+                """,
+                """
+                CREATE TRIGGER courses_trigram_au AFTER UPDATE OF title, description, status ON course_course
+                WHEN old.title IS NOT new.title
+                  OR old.description IS NOT new.description
+                  OR old.status IS NOT new.status BEGIN
+                    INSERT INTO courses_trigram_fts(courses_trigram_fts, rowid, title, description)
+                    SELECT 'delete', old.id, old.title, old.description
+                    WHERE old.status = 'published';
+                    INSERT INTO courses_trigram_fts(rowid, title, description)
+                    SELECT new.id, new.title, new.description
+                    WHERE new.status = 'published';
+                END;
+                """,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS courses_trigram_au;",
+                "DROP TRIGGER IF EXISTS courses_trigram_ad;",
+                "DROP TRIGGER IF EXISTS courses_trigram_ai;",
+                "DROP TABLE IF EXISTS courses_trigram_fts;",
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseTrigramIndex',
+            fields=[
+                ('course', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='trigram_index', serialize=False, to='course.course')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('document', course.search.FTS5Field(db_column='courses_trigram_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'courses_trigram_fts',
+                'managed': False,
+            },
+        ),
+    ]
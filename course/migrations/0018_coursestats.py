@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Backfill the counters the signal handlers in course/stats.py maintain from
+# here on.
+BACKFILL = """
+INSERT INTO course_coursestats (
+    course_id, avg_rating, rating_count, enrollment_count,
+    video_count, reading_count, quiz_count
+)
+SELECT
+    c.id,
+    (SELECT AVG(r.rating) FROM course_rating r WHERE r.course_id = c.id),
+    (SELECT COUNT(*) FROM course_rating r WHERE r.course_id = c.id),
+    (SELECT COUNT(*) FROM course_enrollment e WHERE e.course_id = c.id),
+    (SELECT COUNT(*) FROM course_material m JOIN course_module md ON md.id = m.module_id
+     WHERE md.course_id = c.id AND m.type = 'video'),
+    (SELECT COUNT(*) FROM course_material m JOIN course_module md ON md.id = m.module_id
+     WHERE md.course_id = c.id AND m.type = 'reading'),
+    (SELECT COUNT(*) FROM course_material m JOIN course_module md ON md.id = m.module_id
+     WHERE md.course_id = c.id AND m.type = 'quiz')
+FROM course_course c;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0017_trigram_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='course.course')),
+                ('avg_rating', models.FloatField(blank=True, null=True)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('enrollment_count', models.PositiveIntegerField(default=0)),
+                ('video_count', models.PositiveIntegerField(default=0)),
+                ('reading_count', models.PositiveIntegerField(default=0)),
+                ('quiz_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-enrollment_count', '-course'], name='course_cour_enrollm_599876_idx')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0018_coursestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videomaterial',
+            name='segments',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='transcribed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
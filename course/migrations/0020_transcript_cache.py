@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0019_transcript_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videomaterial',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='TranscriptCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('model', models.CharField(max_length=50)),
+                ('version', models.CharField(blank=True, max_length=50)),
+                ('text', models.TextField(blank=True)),
+                ('segments', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'model', 'version'), name='unique_transcript_per_model')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0020_transcript_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videomaterial',
+            name='transcript_chunks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='transcript_chunks_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='transcript_status',
+            field=models.CharField(choices=[('none', 'Not transcribed'), ('pending', 'Queued'), ('running', 'Transcribing'), ('done', 'Done'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.RunSQL(
+            "UPDATE course_videomaterial SET transcript_status = 'done' "
+            "WHERE transcribed_at IS NOT NULL OR transcript != '';",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:20
+
+from django.db import migrations
+
+from course.search import VIDEO_CONTENT_TRIGGERS
+
+
+# 0019-0021 rebuilt course_videomaterial, which dropped the transcript
+# triggers from 0014; put them back and re-index whatever transcripts landed
+# in the meantime.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0022_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                *VIDEO_CONTENT_TRIGGERS,
+                "DELETE FROM course_content_fts WHERE rowid % 4 = 3;",
+                """
+                INSERT INTO course_content_fts(rowid, course_id, body)
+                SELECT v.id * 4 + 3, m.course_id, v.transcript
+                FROM course_videomaterial v
+                JOIN course_material mat ON mat.id = v.material_id
+                JOIN course_module m ON m.id = mat.module_id
+                WHERE v.transcript != '';
+                """,
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
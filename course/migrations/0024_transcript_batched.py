@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0023_restore_video_content_triggers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='videomaterial',
+            name='transcript_status',
+            field=models.CharField(choices=[('none', 'Not transcribed'), ('pending', 'Queued'), ('batched', 'Waiting for batch'), ('running', 'Transcribing'), ('done', 'Done'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+    ]
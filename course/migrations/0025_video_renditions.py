@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:30
+
+from django.db import migrations, models
+
+from course.search import VIDEO_CONTENT_TRIGGERS
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0024_transcript_batched'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videomaterial',
+            name='fallback',
+            field=models.FileField(blank=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='playlist',
+            field=models.FileField(blank=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='renditions',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        # adding the columns rebuilds the table on SQLite, dropping its triggers
+        migrations.RunSQL(VIDEO_CONTENT_TRIGGERS, reverse_sql=migrations.RunSQL.noop),
+    ]
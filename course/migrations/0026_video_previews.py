@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-17 16:10
+
+from django.db import migrations, models
+
+from course.search import VIDEO_CONTENT_TRIGGERS
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0025_video_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videomaterial',
+            name='codec',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='poster',
+            field=models.FileField(blank=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='thumbnails',
+            field=models.FileField(blank=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='videomaterial',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        # adding the columns rebuilds the table on SQLite, dropping its triggers
+        migrations.RunSQL(VIDEO_CONTENT_TRIGGERS, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -1,7 +1,11 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .search import FTS5Field
+
 class Course(models.Model):
     CATEGORY_CHOICES = [
         ("computer-science", "Computer Science"),
@@ -45,6 +49,50 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
 
+class CourseSearchIndex(models.Model):
+    """
+    Read-only view over the ``courses_fts`` FTS5 table (see migration 0011).
+    Rows are maintained by triggers on ``course_course``.
+    """
+    course = models.OneToOneField(
+        Course,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        related_name="search_index"
+    )
+    title = models.TextField()
+    description = models.TextField()
+    document = FTS5Field(db_column="courses_fts")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "courses_fts"
+
+
+class CourseTrigramIndex(models.Model):
+    """
+    Read-only view over ``courses_trigram_fts`` (see migration 0017), the
+    trigram-tokenized twin of ``courses_fts`` used for typo-tolerant search.
+    """
+    course = models.OneToOneField(
+        Course,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        related_name="trigram_index"
+    )
+    title = models.TextField()
+    description = models.TextField()
+    document = FTS5Field(db_column="courses_trigram_fts")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "courses_trigram_fts"
+
+
 class Enrollment(models.Model):
     STATUS_CHOICES = [
         ("enrolled", "Enrolled"),
@@ -92,11 +140,72 @@ class Material(models.Model):
     type = models.CharField(max_length=10, choices=Type.choices, blank=False)
     
 class VideoMaterial(models.Model):
+    class TranscriptStatus(models.TextChoices):
+        NONE = "none", "Not transcribed"
+        PENDING = "pending", "Queued"
+        BATCHED = "batched", "Waiting for batch"
+        RUNNING = "running", "Transcribing"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
     material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name="video")
     path = models.FileField(upload_to='videos/')
     title = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     transcript = models.TextField(blank=True)
+    # [{"start": seconds, "end": seconds, "text": ...}], served as WebVTT
+    segments = models.JSONField(default=list, blank=True)
+    transcribed_at = models.DateTimeField(null=True, blank=True)
+    # SHA-256 of the uploaded bytes, the key for TranscriptCache
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    transcript_status = models.CharField(
+        max_length=10, choices=TranscriptStatus.choices, default=TranscriptStatus.NONE
+    )
+    transcript_chunks = models.PositiveIntegerField(default=0)
+    transcript_chunks_done = models.PositiveIntegerField(default=0)
+    # HLS ladder and faststart MP4 made by course.tasks.transcode; until
+    # they exist the player falls back to the original upload
+    playlist = models.FileField(blank=True)
+    fallback = models.FileField(blank=True)
+    # [{"name": "720p", "height": 720, "bandwidth": bits/s, "playlist": ...}]
+    renditions = models.JSONField(default=list, blank=True)
+    # probed once after upload by course.tasks.video_previews
+    duration = models.FloatField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    codec = models.CharField(max_length=32, blank=True)
+    poster = models.FileField(blank=True)
+    # WebVTT index into a sprite sheet of scrub preview frames
+    thumbnails = models.FileField(blank=True)
+
+    @property
+    def transcript_progress(self):
+        if self.transcript_status == self.TranscriptStatus.DONE:
+            return 100
+        if not self.transcript_chunks:
+            return 0
+        # a redelivered chunk can be counted twice
+        return min(99, 100 * self.transcript_chunks_done // self.transcript_chunks)
+
+
+class TranscriptCache(models.Model):
+    """
+    One transcription per distinct file and model, so re-uploads and copied
+    courses reuse it instead of transcribing the same bytes again.
+    """
+    content_hash = models.CharField(max_length=64)
+    model = models.CharField(max_length=50)
+    version = models.CharField(max_length=50, blank=True)
+    text = models.TextField(blank=True)
+    segments = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash", "model", "version"], name="unique_transcript_per_model"
+            ),
+        ]
 
 
 class ReadingMaterial(models.Model):
@@ -107,6 +216,101 @@ class ReadingMaterial(models.Model):
 
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
+class CourseContentIndex(models.Model):
+    """
+    Read-only view over the ``course_content_fts`` FTS5 table (see migration
+    0014). Holds module names, material names, reading text and video
+    transcripts, maintained row by row by triggers on the source tables.
+    """
+    id = models.BigIntegerField(primary_key=True, db_column="rowid")
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.DO_NOTHING,
+        related_name="content_index"
+    )
+    body = models.TextField()
+    document = FTS5Field(db_column="course_content_fts")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "course_content_fts"
+
+
+class CourseStats(models.Model):
+    """
+    Denormalized per-course counters so catalog pages never aggregate
+    ratings, enrollments or materials at request time. Kept up to date by
+    the signal handlers in ``course/stats.py`` and repairable with
+    ``manage.py reconcile_course_stats``.
+    """
+    course = models.OneToOneField(
+        Course,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats"
+    )
+    avg_rating = models.FloatField(null=True, blank=True)
+    rating_count = models.PositiveIntegerField(default=0)
+    enrollment_count = models.PositiveIntegerField(default=0)
+    video_count = models.PositiveIntegerField(default=0)
+    reading_count = models.PositiveIntegerField(default=0)
+    quiz_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-enrollment_count", "-course"]),
+        ]
+
+
+class BackgroundJob(models.Model):
+    """
+    Task queue for standalone installs without a broker, drained by the
+    in-process worker threads in ``course.jobs.LocalBackend``.
+    """
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    task = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    priority = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "priority", "id"]),
+        ]
+
+
+class ResumableUpload(models.Model):
+    """
+    A material's file arriving in pieces through the resumable upload
+    endpoints (see ``course.uploads``). The bytes are written straight into
+    ``name``, where the file will live once the upload is finalized.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name="uploads")
+    # storage name, already under the field's upload_to
+    name = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def complete(self):
+        return self.offset == self.length
+
+
 class Progress(models.Model):
     material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name="progress")
     user = models.ForeignKey(
@@ -0,0 +1,150 @@
+import json
+import base64
+import datetime
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(position, reverse=False):
+    values = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in position]
+    payload = json.dumps({"p": values, "r": reverse}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return list(payload["p"]), bool(payload["r"])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+
+
+def _flip(key):
+    return key[1:] if key.startswith("-") else f"-{key}"
+
+
+def _after(keys, position):
+    """
+    Rows strictly after ``position`` in ``keys`` order, i.e. the expanded
+    form of ``(k1, k2, ...) > (v1, v2, ...)`` with per-key direction.
+    """
+    clauses = []
+    for i, key in enumerate(keys):
+        field = key.lstrip("-")
+        lookup = "lt" if key.startswith("-") else "gt"
+        equal = {k.lstrip("-"): v for k, v in zip(keys[:i], position[:i])}
+        clauses.append(Q(**equal, **{f"{field}__{lookup}": position[i]}))
+    return reduce(lambda a, b: a | b, clauses)
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset. Iterates like a Django ``Page``
+    and carries opaque cursors for its neighbours instead of page numbers.
+    """
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def keyset_page(queryset, keys, cursor, per_page):
+    """
+    Fetch the page after (or, for a backwards cursor, before) ``cursor``.
+
+    ``keys`` are ``order_by`` names and must end with a unique one such as
+    ``-id``. Every page is one ``WHERE (keys) > (cursor) ... LIMIT`` query,
+    so there is no COUNT and no OFFSET. Raises ``ValueError`` for a cursor
+    that doesn't decode.
+    """
+    position, reverse = decode_cursor(cursor) if cursor else (None, False)
+    if position is not None and len(position) != len(keys):
+        raise ValueError("Invalid cursor")
+
+    ordering = [_flip(key) for key in keys] if reverse else list(keys)
+    if position is not None:
+        try:
+            queryset = queryset.filter(_after(ordering, position))
+        except (TypeError, ValueError, ValidationError):
+            raise ValueError("Invalid cursor")
+
+    rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+
+    def position_of(row):
+        return [getattr(row, key.lstrip("-")) for key in keys]
+
+    has_next = has_more if not reverse else position is not None
+    has_previous = has_more if reverse else position is not None
+    return KeysetPage(
+        rows,
+        encode_cursor(position_of(rows[-1])) if rows and has_next else None,
+        encode_cursor(position_of(rows[0]), reverse=True) if rows and has_previous else None,
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination on top of ``keyset_page``. The view provides the sort
+    keys as ``view.keyset_keys``.
+    """
+    page_size = 9
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = keyset_page(
+                queryset,
+                view.keyset_keys,  # type: ignore
+                request.query_params.get(self.cursor_query_param),
+                self.page_size,
+            )
+        except ValueError:
+            raise NotFound("Invalid cursor")
+        return self.page.object_list
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_link(self.page.next_cursor),
+            "previous": self.get_link(self.page.previous_cursor),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
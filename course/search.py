@@ -0,0 +1,207 @@
+import re
+
+from django.db import connection, models
+from django.db.models import Case, F, Min, Lookup, Value, When
+
+
+class FTS5Field(models.TextField):
+    """
+    The hidden column an FTS5 table shares its name with. It only exists to be
+    the left-hand side of a ``match`` lookup.
+    """
+
+
+# Triggers keeping video transcripts in course_content_fts (see migration
+# 0014). SQLite drops a table's triggers when Django rebuilds it, which most
+# AddField/AlterField operations on course_videomaterial do, so migrations
+# that touch that table run these again.
+VIDEO_CONTENT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS course_video_content_ai AFTER INSERT ON course_videomaterial
+    WHEN new.transcript != '' BEGIN
+        INSERT INTO course_content_fts(rowid, course_id, body)
+        SELECT new.id * 4 + 3, m.course_id, new.transcript
+        FROM course_material mat JOIN course_module m ON m.id = mat.module_id
+        WHERE mat.id = new.material_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS course_video_content_au
+    AFTER UPDATE OF transcript, material_id ON course_videomaterial
+    WHEN old.transcript IS NOT new.transcript OR old.material_id IS NOT new.material_id BEGIN
+        DELETE FROM course_content_fts WHERE rowid = old.id * 4 + 3;
+        INSERT INTO course_content_fts(rowid, course_id, body)
+        SELECT new.id * 4 + 3, m.course_id, new.transcript
+        FROM course_material mat JOIN course_module m ON m.id = mat.module_id
+        WHERE mat.id = new.material_id AND new.transcript != '';
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS course_video_content_ad AFTER DELETE ON course_videomaterial BEGIN
+        DELETE FROM course_content_fts WHERE rowid = old.id * 4 + 3;
+    END;
+    """,
+]
+
+
+@FTS5Field.register_lookup
+class Match(Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", (*lhs_params, *rhs_params)
+
+
+def fts_query(q):
+    """
+    ``q`` as an FTS5 query that can never be FTS5 syntax: its words, each
+    quoted, the last one prefix matched so results show up while typing.
+    ``""`` when ``q`` has no words at all.
+    """
+    words = tokenize(q)
+    return prefix_query(words) if words else ""
+
+
+def tokenize(q):
+    return re.findall(r"\w+", q.lower())
+
+
+def transpositions(word):
+    # the word itself plus every swap of two neighbouring letters, since a
+    # swap ("pyhton") breaks every trigram around it
+    yield word
+    for i in range(len(word) - 1):
+        yield word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def trigrams(word):
+    return [word[i:i + 3] for i in range(len(word) - 2)]
+
+
+def prefix_query(words):
+    """
+    Quote every word so half-typed input can never be an FTS5 syntax error,
+    and prefix match the last one.
+    """
+    return " ".join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+
+
+def search(courses, q, scope="course"):
+    """
+    Restrict ``courses`` to the ones matching ``q`` and annotate them with
+    ``search_rank`` (bm25, lower is better).
+
+    ``scope="course"`` searches titles and descriptions in ``courses_fts``.
+    ``scope="content"`` searches module/material names, reading text and
+    transcripts in ``course_content_fts`` and ranks each course by its best
+    hit. Either way the index is joined in SQL, so SQLite drives the query
+    from the FTS match and pagination happens in the same statement.
+    """
+    query = fts_query(q)
+    if not query:
+        # only punctuation: nothing to match, and MATCH '' is an error
+        return courses.none().annotate(search_rank=Value(0.0))
+    if scope == "content":
+        return courses.filter(
+            content_index__document__match=query
+        ).annotate(search_rank=Min("content_index__rank"))
+
+    return courses.filter(
+        search_index__document__match=query
+    ).annotate(search_rank=F("search_index__rank"))
+
+
+FUZZY_CANDIDATES = 50
+# share of the query's trigrams a course must have to count as similar
+FUZZY_MIN_OVERLAP = 0.5
+# and words looked at, so a pasted paragraph can't make a huge query
+FUZZY_MAX_WORDS = 8
+# fewer exact hits than this and similar courses are listed after them
+FUZZY_FALLBACK_HITS = 3
+
+
+def fuzzy_overlap(q):
+    """
+    ``{course id: overlap}`` for the published courses similar to ``q``.
+
+    One trigram MATCH of all the query's trigrams (each word as typed and
+    with two neighbouring letters swapped) OR-ed together lets SQLite pick
+    the ``FUZZY_CANDIDATES`` best by bm25, so the work stays bounded however
+    large the catalog. Only those are scored: each word counts the share of
+    its trigrams in the course's title and description, taking the better
+    of its variants, and courses with at least ``FUZZY_MIN_OVERLAP`` of them
+    overall are kept.
+    """
+    words = [word for word in tokenize(q) if len(word) >= 3][:FUZZY_MAX_WORDS]
+    if not words:
+        return {}
+    variants = {word: set(transpositions(word)) for word in words}
+    grams = sorted({gram for word in words for variant in variants[word] for gram in trigrams(variant)})
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid, title, description FROM courses_trigram_fts WHERE courses_trigram_fts MATCH %s "
+            "ORDER BY rank LIMIT %s",
+            [" OR ".join(f'"{gram}"' for gram in grams), FUZZY_CANDIDATES],
+        )
+        rows = cursor.fetchall()
+
+    total = sum(len(trigrams(word)) for word in words)
+    overlap = {}
+    for course_id, title, description in rows:
+        # the trigram tokenizer matches case-insensitively too
+        text = f"{title}\n{description}".lower()
+        shared = sum(
+            max(sum(gram in text for gram in trigrams(variant)) for variant in variants[word])
+            for word in words
+        )
+        if shared >= FUZZY_MIN_OVERLAP * total:
+            overlap[course_id] = shared / total
+    return overlap
+
+
+def _ranked(courses, ranks):
+    if not ranks:
+        # still annotated, so callers can order and paginate an empty result
+        return courses.none().annotate(search_rank=Value(0.0))
+    return courses.filter(id__in=ranks).annotate(search_rank=Case(
+        *[When(id=course_id, then=Value(rank)) for course_id, rank in ranks.items()],
+        output_field=models.FloatField(),
+    ))
+
+
+def fuzzy_search(courses, q):
+    """
+    Typo-tolerant search over ``courses_trigram_fts``: ``courses`` similar
+    to ``q`` (see ``fuzzy_overlap``), annotated with ``search_rank``, minus
+    their overlap so lower is better like bm25.
+    """
+    return _ranked(courses, {course_id: -share for course_id, share in fuzzy_overlap(q).items()})
+
+
+def with_fuzzy(courses, results, q):
+    """
+    ``results`` of ``search`` followed by the ``fuzzy_search`` hits that
+    aren't among them, for when there are only a few. Returns the queryset
+    and whether any similar courses were added.
+    """
+    exact = dict(results.values_list("id", "search_rank"))
+    ranks = {course_id: -share for course_id, share in fuzzy_overlap(q).items()}
+    # bm25 is negative and overlap at most 1, so exact hits stay in front
+    ranks.update({course_id: rank - 2 for course_id, rank in exact.items()})
+    if len(ranks) == len(exact):
+        return results, False
+    return _ranked(courses, ranks), True
+
+
+def search_or_fuzzy(courses, q, scope="course"):
+    """
+    ``search``, with similar courses added by ``with_fuzzy`` when titles
+    and descriptions give fewer than ``FUZZY_FALLBACK_HITS`` hits. Returns
+    the queryset and whether similar courses were added.
+    """
+    results = search(courses, q, scope)
+    if scope == "course" and results[:FUZZY_FALLBACK_HITS].count() < FUZZY_FALLBACK_HITS:
+        return with_fuzzy(courses, results, q)
+    return results, False
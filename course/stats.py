@@ -0,0 +1,119 @@
+from django.db.models import Avg, Count, F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Course, CourseStats, Enrollment, Material, Module, Rating
+
+
+# Rows are only ever updated here, never created, so a cascade that deletes
+# a course's stats before its enrollments can't resurrect them. Anything
+# that bypasses signals (queryset.update, bulk_create, raw SQL) is repaired
+# by ``manage.py reconcile_course_stats``.
+
+MATERIAL_COUNT_FIELDS = {
+    Material.Type.VIDEO: "video_count",
+    Material.Type.READING: "reading_count",
+    Material.Type.QUIZ: "quiz_count",
+}
+STAT_FIELDS = [
+    "avg_rating", "rating_count", "enrollment_count", *MATERIAL_COUNT_FIELDS.values()
+]
+
+
+def compute_stats(course_ids):
+    """
+    Recount the statistics of ``course_ids`` from the source tables. One
+    grouped query per table, so it is cheap enough for a whole catalog.
+    """
+    stats = {
+        cid: {"avg_rating": None, "rating_count": 0, "enrollment_count": 0,
+              **{field: 0 for field in MATERIAL_COUNT_FIELDS.values()}}
+        for cid in course_ids
+    }
+    ratings = (
+        Rating.objects.filter(course_id__in=course_ids)
+        .values("course_id")
+        .annotate(avg=Avg("rating"), count=Count("id"))
+        .order_by()
+    )
+    for row in ratings:
+        stats[row["course_id"]].update(avg_rating=row["avg"], rating_count=row["count"])
+
+    enrollments = (
+        Enrollment.objects.filter(course_id__in=course_ids)
+        .values("course_id")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in enrollments:
+        stats[row["course_id"]]["enrollment_count"] = row["count"]
+
+    materials = (
+        Material.objects.filter(module__course_id__in=course_ids)
+        .values("module__course_id", "type")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in materials:
+        field = MATERIAL_COUNT_FIELDS.get(row["type"])
+        if field:
+            stats[row["module__course_id"]][field] = row["count"]
+    return stats
+
+
+def _bump(course_id, field, delta):
+    CourseStats.objects.filter(course_id=course_id).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Course)
+def handle_course_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+@receiver(post_save, sender=Enrollment)
+def handle_enrollment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump(instance.course_id, "enrollment_count", 1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def handle_enrollment_deleted(sender, instance, **kwargs):
+    _bump(instance.course_id, "enrollment_count", -1)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def handle_rating_changed(sender, instance, raw=False, **kwargs):
+    # an average can't be adjusted by a delta without the old value, so
+    # recount this course's ratings; the course_id index keeps it small
+    if raw:
+        return
+    stats = (
+        Rating.objects.filter(course_id=instance.course_id)
+        .aggregate(avg_rating=Avg("rating"), rating_count=Count("id"))
+    )
+    CourseStats.objects.filter(course_id=instance.course_id).update(**stats)
+
+
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+def handle_material_changed(sender, instance, raw=False, **kwargs):
+    # a save may have changed the type, so recount rather than bump
+    if raw:
+        return
+    course_id = (
+        Module.objects.filter(pk=instance.module_id)
+        .values_list("course_id", flat=True).first()
+    )
+    if course_id is None:
+        return
+    counts = dict.fromkeys(MATERIAL_COUNT_FIELDS.values(), 0)
+    rows = (
+        Material.objects.filter(module__course_id=course_id)
+        .values_list("type").annotate(count=Count("id")).order_by()
+    )
+    for material_type, count in rows:
+        if material_type in MATERIAL_COUNT_FIELDS:
+            counts[MATERIAL_COUNT_FIELDS[material_type]] = count
+    CourseStats.objects.filter(course_id=course_id).update(**counts)
@@ -0,0 +1,275 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+from celery import chord, shared_task
+from celery.signals import celeryd_after_setup, worker_process_init
+from django.conf import settings
+from django.db import OperationalError
+from django.db.models import F
+from django.utils.timezone import now
+
+from .models import TranscriptCache, VideoMaterial
+from .uploads import file_sha256
+from . import images, transcoding, transcription
+from .transcription import (
+    BATCH_CLIP_SECONDS,
+    SAMPLE_RATE,
+    audio_path,
+    benchmark,
+    extract_audio,
+    load_pcm,
+    loaded_models,
+    model_for_queue,
+    model_label,
+    preload,
+    split_on_silence,
+    stitch,
+    transcribe_clips,
+    transcribe_samples,
+    whisper_version,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Only the worker imports this module (through autodiscover_tasks); the web
+# tier enqueues by name via course.jobs, so whisper and torch stay out of
+# web processes. whisper itself is imported when course.transcription loads
+# the first model.
+
+_worker_queues = []
+
+
+@celeryd_after_setup.connect
+def remember_queues(sender, instance, **kwargs):
+    # runs in the parent before the pool forks, so the children inherit it
+    _worker_queues[:] = list(instance.app.amqp.queues.consume_from)
+    transcription._concurrency = instance.concurrency or 1
+
+
+@worker_process_init.connect
+def load_models(**kwargs):
+    preload(_worker_queues or ["celery"])
+
+
+def _queue(task):
+    return (task.request.delivery_info or {}).get("routing_key")
+
+
+Status = VideoMaterial.TranscriptStatus
+
+# Every step can safely run twice: chunk results only depend on the audio
+# and the stitched transcript overwrites. So tasks are acked after they
+# finish and redelivered if a worker dies halfway through.
+RELIABLE = {
+    "acks_late": True,
+    "reject_on_worker_lost": True,
+    "autoretry_for": (OperationalError,),
+    "retry_backoff": True,
+    "max_retries": 3,
+}
+
+
+def _set_status(video_id, status, **fields):
+    VideoMaterial.objects.filter(id=video_id).update(transcript_status=status, **fields)
+
+
+@shared_task(bind=True, name="course.transcribe", soft_time_limit=30 * 60, time_limit=35 * 60, **RELIABLE)
+def transcribe(self, video_id):
+    """
+    Extract the audio once, cut it at silences and fan the chunks out as a
+    chord so a long lecture is transcribed by every free worker process.
+    """
+    video = VideoMaterial.objects.get(id=video_id)
+    if video.transcript_status == Status.DONE:
+        # a redelivery of a job that already finished
+        return None
+    _set_status(video.id, Status.RUNNING, transcript_chunks=0, transcript_chunks_done=0)
+
+    try:
+        if not video.content_hash:
+            # uploads made before hashing existed
+            video.content_hash = file_sha256(video.path.path)
+            VideoMaterial.objects.filter(id=video.id).update(content_hash=video.content_hash)
+
+        queue = _queue(self)
+        key = {
+            "content_hash": video.content_hash,
+            "model": model_label(model_for_queue(queue)),
+            "version": whisper_version(),
+        }
+        cached = TranscriptCache.objects.filter(**key).first()
+        if cached is not None:
+            _apply_transcript(video.id, cached.text, cached.segments)
+            return None
+
+        pcm = audio_path(video.id)
+        samples = extract_audio(video.path.path, pcm)
+        options = {"queue": queue} if queue else {}
+        if settings.WHISPER_BATCH_SIZE > 1 and samples <= BATCH_CLIP_SECONDS * SAMPLE_RATE:
+            # short clip: wait for others to share a decoder pass with
+            _set_status(video.id, Status.BATCHED, transcript_chunks=1)
+            transcribe_batch.apply_async(countdown=settings.WHISPER_BATCH_WINDOW, **options)
+            return None
+        chunks = split_on_silence(load_pcm(pcm))
+        _set_status(video.id, Status.RUNNING, transcript_chunks=len(chunks))
+    except Exception:
+        _set_status(video.id, Status.FAILED)
+        raise
+
+    header = [
+        transcribe_chunk.s(video.id, str(pcm), start, end).set(**options) for start, end in chunks
+    ]
+    if not self.request.is_eager:
+        body = save_transcript.s(video.id, str(pcm), key).set(**options)
+        return chord(header)(body.on_error(transcription_failed.si(video.id))).id
+
+    # Run inline (LocalBackend, transcribe_backfill), an eager chord would
+    # raise a failing chunk out of here without calling its errback, and its
+    # check against joining inside a task is a process-wide flag that other
+    # threads' eager tasks flip. So the steps are run here one by one.
+    try:
+        parts = [chunk.apply().get(disable_sync_subtasks=False) for chunk in header]
+        save_transcript.apply(args=(parts, video.id, str(pcm), key)).get(disable_sync_subtasks=False)
+    except Exception:
+        transcription_failed(video.id)
+        raise
+    return None
+
+
+@shared_task(bind=True, name="course.transcribe_chunk", soft_time_limit=15 * 60, time_limit=20 * 60, **RELIABLE)
+def transcribe_chunk(self, video_id, pcm, start, end):
+    name = model_for_queue(_queue(self))
+    result = transcribe_samples(name, load_pcm(pcm)[start:end], start / SAMPLE_RATE)
+    VideoMaterial.objects.filter(id=video_id).update(
+        transcript_chunks_done=F("transcript_chunks_done") + 1
+    )
+    return result
+
+
+def _apply_transcript(video_id, text, segments):
+    _set_status(
+        video_id, Status.DONE, transcript=text, segments=segments, transcribed_at=now()
+    )
+
+
+@shared_task(name="course.save_transcript", **RELIABLE)
+def save_transcript(parts, video_id, pcm, key):
+    result = stitch(parts)
+    logger.info("Transcribed video %s, skipped %.1fs of silence", video_id, result["skipped_seconds"])
+    _apply_transcript(video_id, result["text"], result["segments"])
+    TranscriptCache.objects.update_or_create(
+        **key, defaults={"text": result["text"], "segments": result["segments"]}
+    )
+    Path(pcm).unlink(missing_ok=True)
+    return result
+
+
+# most clips one batch task takes; the rest wait for the next one
+BATCH_CLIPS = 32
+
+
+@shared_task(bind=True, name="course.transcribe_batch", soft_time_limit=15 * 60, time_limit=20 * 60, **RELIABLE)
+def transcribe_batch(self):
+    """
+    Transcribe the short clips waiting for a batch together. Every short
+    clip schedules one of these after the collection window, so the first
+    to run takes them all and the rest find nothing left.
+    """
+    waiting = VideoMaterial.objects.filter(transcript_status=Status.BATCHED)
+    claimed = [
+        video_id
+        for video_id in waiting.order_by("id").values_list("id", flat=True)[:BATCH_CLIPS]
+        # another batch may have taken it since the SELECT
+        if waiting.filter(id=video_id).update(transcript_status=Status.RUNNING)
+    ]
+    if not claimed:
+        return []
+
+    name = model_for_queue(_queue(self))
+    videos = VideoMaterial.objects.in_bulk(claimed)
+    try:
+        results = transcribe_clips(
+            name, [load_pcm(audio_path(video_id)) for video_id in claimed], settings.WHISPER_BATCH_SIZE
+        )
+    except OperationalError:
+        # retried, so hand the clips back
+        VideoMaterial.objects.filter(id__in=claimed).update(transcript_status=Status.BATCHED)
+        raise
+    except Exception:
+        for video_id in claimed:
+            transcription_failed(video_id)
+        raise
+
+    key = {"model": model_label(name), "version": whisper_version()}
+    for video_id, result in zip(claimed, results):
+        _apply_transcript(video_id, result["text"], result["segments"])
+        TranscriptCache.objects.update_or_create(
+            content_hash=videos[video_id].content_hash, **key,
+            defaults={"text": result["text"], "segments": result["segments"]},
+        )
+        audio_path(video_id).unlink(missing_ok=True)
+    logger.info(
+        "Transcribed %d clips in one batch, skipped %.1fs of silence",
+        len(claimed), sum(result["skipped_seconds"] for result in results),
+    )
+    return claimed
+
+
+@shared_task(name="course.transcription_failed")
+def transcription_failed(video_id):
+    _set_status(video_id, Status.FAILED)
+    audio_path(video_id).unlink(missing_ok=True)
+
+
+@shared_task(name="course.transcode", soft_time_limit=2 * 60 * 60, time_limit=2 * 60 * 60 + 300, **RELIABLE)
+def transcode(video_id):
+    """Encode a video's HLS ladder and MP4 fallback for the player."""
+    video = VideoMaterial.objects.get(id=video_id)
+    renditions = transcoding.transcode(video.id, video.path.path)
+    # only if the file wasn't replaced while this ran; the new one has its own job
+    VideoMaterial.objects.filter(id=video.id, path=video.path.name).update(**renditions)
+    logger.info("Transcoded video %s into %s", video.id, ", ".join(r["name"] for r in renditions["renditions"]))
+    return renditions
+
+
+@shared_task(name="course.video_previews", soft_time_limit=15 * 60, time_limit=20 * 60, **RELIABLE)
+def video_previews(video_id):
+    """Probe a new upload and make its poster and scrub preview sprites."""
+    video = VideoMaterial.objects.get(id=video_id)
+    fields = transcoding.previews(video.id, video.path.path)
+    VideoMaterial.objects.filter(id=video.id, path=video.path.name).update(**fields)
+    return fields
+
+
+@shared_task(name="course.image_derivatives", soft_time_limit=5 * 60, time_limit=6 * 60, **RELIABLE)
+def image_derivatives(name):
+    """Make the WebP and JPEG sizes of an uploaded image for the picture tag."""
+    return images.generate(name)
+
+
+@shared_task(bind=True, name="course.benchmark_transcription")
+def benchmark_transcription(self, video_id=None, seconds=60):
+    """
+    Real-time factor of this worker's model and inference settings, on the
+    first ``seconds`` of a video or, without one, on synthetic noise.
+    """
+    name = model_for_queue(_queue(self))
+    if video_id is None:
+        samples = (np.random.default_rng(0).standard_normal(seconds * SAMPLE_RATE) * 3000).astype(np.int16)
+        return benchmark(name, samples)
+
+    video = VideoMaterial.objects.get(id=video_id)
+    pcm = audio_path(f"benchmark-{video.id}")
+    extract_audio(video.path.path, pcm)
+    try:
+        return benchmark(name, np.array(load_pcm(pcm)[:seconds * SAMPLE_RATE]))
+    finally:
+        pcm.unlink(missing_ok=True)
+
+
+@shared_task(name="course.whisper_stats")
+def whisper_stats():
+    """Load time and memory of the models held by the worker process that runs this."""
+    return loaded_models()
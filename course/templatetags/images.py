@@ -0,0 +1,30 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from ..images import derivatives
+
+register = template.Library()
+
+def _srcset(storage, sizes):
+    return ", ".join(f"{storage.url(name)} {width}w" for width, name in sizes)
+
+@register.simple_tag
+def picture(image, sizes="100vw", **attrs):
+    """
+    An uploaded image as a ``<picture>`` offering its WebP and JPEG
+    derivatives, so the browser picks the smallest that fills ``sizes``.
+    Extra keyword arguments become attributes of the ``<img>``. The
+    original is used until the derivatives have been made.
+    """
+    attrs.setdefault("loading", "lazy")
+    found = derivatives(image.name, image.storage)
+    if not found:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+    _, largest = found["jpg"][-1]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        _srcset(image.storage, found["webp"]), sizes,
+        image.storage.url(largest), _srcset(image.storage, found["jpg"]), sizes, flatatt(attrs),
+    )
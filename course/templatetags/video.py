@@ -0,0 +1,27 @@
+from django import template
+
+from ..models import VideoMaterial
+
+register = template.Library()
+
+@register.simple_tag
+def video_durations(course):
+    """Length of every video in ``course`` by material id, in one query."""
+    return dict(
+        VideoMaterial.objects
+        .filter(material__module__course=course, duration__isnull=False)
+        .values_list("material_id", "duration")
+    )
+
+@register.filter
+def duration(seconds):
+    """``754.2`` seconds as ``12:34``, with hours when there are any."""
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+@register.filter
+def duration_of(material, durations):
+    return duration(durations.get(material.id))
@@ -1,16 +1,58 @@
+import sys
+import base64
 import json
+import os
+import hashlib
+import subprocess
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import SimpleNamespace
 from datetime import date, timedelta
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import factory
+import numpy as np
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.timezone import now
 from faker import Faker
 
+from elearning.celery import app as celery_app
+
 from .forms import CourseForm, RatingForm
-from .models import Course, Enrollment, Instructor, Module, Material, Progress, Rating
-from .views import is_enrolled, is_eligible_to_enroll
+from .models import (
+    BackgroundJob,
+    Course,
+    CourseContentIndex,
+    CourseSearchIndex,
+    CourseStats,
+    Enrollment,
+    Instructor,
+    Module,
+    Material,
+    Progress,
+    Rating,
+    ReadingMaterial,
+    ResumableUpload,
+    TranscriptCache,
+    VideoMaterial,
+)
+from . import images, transcoding, transcription, uploads
+from .captions import to_webvtt
+from .jobs import CeleryBackend, LocalBackend, enqueue_transcription
+from .search import fuzzy_search, search, search_or_fuzzy
+from .views import detail_aggregates, is_enrolled, is_eligible_to_enroll
 
 User = get_user_model()
 fake = Faker()
@@ -481,4 +523,1644 @@ class RatingNonEnrolledRedirectTest(TestCase):
             response,
             reverse("material_overview", kwargs={"cid": self.course.id}),
             fetch_redirect_response=False,
-        )
\ No newline at end of file
+        )
+
+class CourseSearchTest(TestCase):
+    def setUp(self):
+        self.title_hit = CourseFactory(title="Python for Beginners", description="Learn to code.")
+        self.description_hit = CourseFactory(title="Data Analysis", description="Uses python and pandas.")
+        CourseFactory(title="Watercolour Basics", description="Painting for everyone.")
+
+    def test_results_are_ranked_by_bm25(self):
+        results = list(search(Course.objects.all(), "python").order_by("search_rank"))
+        self.assertEqual(results, [self.title_hit, self.description_hit])
+
+    def test_last_word_is_prefix_matched(self):
+        results = search(Course.objects.all(), "pyth")
+        self.assertEqual(results.count(), 2)
+
+    def test_fts_syntax_in_input_is_harmless(self):
+        course = CourseFactory(title="E-learning with C++", description="Pointers and references.")
+        self.client.force_login(UserFactory(is_staff=True))
+        for q in ["e-learning", "c++", '"', "AND", "NOT x", "(", 'python" OR (be']:
+            for scope in ("course", "content"):
+                with self.subTest(q=q, scope=scope):
+                    list(search(Course.objects.all(), q, scope))
+                    self.assertEqual(self.client.get("/courses/", {"q": q, "scope": scope}).status_code, 200)
+                    self.assertEqual(self.client.get(reverse("course_search_api"), {"q": q, "scope": scope}).status_code, 200)
+        self.assertEqual(list(search(Course.objects.all(), "e-learning")), [course])
+
+    def test_search_page_is_a_single_statement(self):
+        courses = search(Course.objects.all(), "python").order_by("search_rank")
+        with self.assertNumQueries(1) as ctx:
+            list(courses[:9])
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertIn("MATCH", sql)
+        self.assertNotIn("CASE", sql)
+        self.assertIn("LIMIT", sql)
+
+    def test_explore_filters_by_query(self):
+        response = self.client.get("/courses/", {"q": "python"}, HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {course.id for course in response.context["page"]},
+            {self.title_hit.id, self.description_hit.id},
+        )
+
+
+class CourseContentSearchTest(TestCase):
+    def setUp(self):
+        self.course = CourseFactory(title="Intro to Statistics", description="Numbers.")
+        self.module = ModuleFactory(course=self.course, name="Regression")
+        self.material = MaterialFactory(module=self.module, name="Lecture one", type="video")
+        self.video = VideoMaterial.objects.create(material=self.material, path="videos/lecture.mp4")
+
+    def test_transcript_is_indexed_when_it_lands(self):
+        self.assertFalse(search(Course.objects.all(), "eigenvalues", "content").exists())
+        self.video.transcript = "Today we talk about eigenvalues."
+        self.video.save()
+        self.assertEqual(list(search(Course.objects.all(), "eigenvalues", "content")), [self.course])
+
+    def test_module_and_reading_text_are_indexed(self):
+        reading = MaterialFactory(module=self.module, type="reading")
+        ReadingMaterial.objects.create(material=reading, text="Least squares fitting explained.")
+        self.assertTrue(search(Course.objects.all(), "regression", "content").exists())
+        self.assertTrue(search(Course.objects.all(), "squares", "content").exists())
+
+    def test_deleting_module_removes_its_rows(self):
+        self.video.transcript = "Today we talk about eigenvalues."
+        self.video.save()
+        self.module.delete()
+        self.assertFalse(CourseContentIndex.objects.filter(course=self.course).exists())
+
+    def test_course_with_many_hits_is_returned_once(self):
+        MaterialFactory(module=self.module, name="Regression lab")
+        MaterialFactory(module=self.module, name="Regression quiz")
+        self.assertEqual(search(Course.objects.all(), "regression", "content").count(), 1)
+
+    def test_explore_content_scope(self):
+        response = self.client.get(
+            "/courses/", {"q": "regression", "scope": "content"}, HTTP_ACCEPT="text/html"
+        )
+        self.assertEqual([course.id for course in response.context["page"]], [self.course.id])
+
+
+class PublishedOnlySearchIndexTest(TestCase):
+    def _indexed(self, course):
+        return CourseSearchIndex.objects.filter(course=course, document__match="Quantum").exists()
+
+    def test_draft_is_not_indexed(self):
+        draft = CourseFactory(title="Quantum Computing", status="draft")
+        self.assertFalse(self._indexed(draft))
+
+    def test_publish_and_unpublish(self):
+        course = CourseFactory(title="Quantum Computing", status="draft")
+        course.status = "published"
+        course.save()
+        self.assertTrue(self._indexed(course))
+        course.status = "draft"
+        course.save()
+        self.assertFalse(self._indexed(course))
+
+    def test_rebuild_command_keeps_only_published(self):
+        published = CourseFactory(title="Quantum Computing")
+        draft = CourseFactory(title="Quantum Mechanics", status="draft")
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertTrue(self._indexed(published))
+        self.assertFalse(self._indexed(draft))
+
+    def test_merge_option(self):
+        out = StringIO()
+        call_command("rebuild_search_index", "--no-rebuild", "--merge", "16", stdout=out)
+        self.assertIn("courses_fts", out.getvalue())
+
+
+class SuggestViewTest(TestCase):
+    URL = "/courses/suggest/"
+
+    def setUp(self):
+        self.course = CourseFactory(title="Python for Beginners", description="Pythonic code.")
+        CourseFactory(title="Python Advanced", status="draft")
+
+    def test_title_completions_and_terms(self):
+        data = self.client.get(self.URL, {"q": "pyt"}).json()
+        self.assertEqual(data["titles"], [{"id": self.course.id, "title": self.course.title}])
+        self.assertEqual(set(data["terms"]), {"python", "pythonic"})
+
+    def test_response_is_cacheable(self):
+        response = self.client.get(self.URL, {"q": "pyt"})
+        self.assertIn("max-age=300", response["Cache-Control"])
+        self.assertIn("public", response["Cache-Control"])
+
+    def test_fts_syntax_in_input_is_harmless(self):
+        response = self.client.get(self.URL, {"q": 'python" (be'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["titles"]), 1)
+
+    def test_short_prefix_returns_nothing(self):
+        with self.assertNumQueries(0):
+            data = self.client.get(self.URL, {"q": "p"}).json()
+        self.assertEqual(data, {"titles": [], "terms": []})
+
+
+class FuzzySearchTest(TestCase):
+    def setUp(self):
+        self.python = CourseFactory(title="Python for Beginners", description="Write your first program.")
+        self.ml = CourseFactory(title="Machine Learning", description="Models and training.")
+        CourseFactory(title="Watercolour Basics", description="Painting for everyone.")
+
+    def test_misspelt_word_falls_back_to_trigrams(self):
+        courses, fuzzy = search_or_fuzzy(Course.objects.all(), "pyhton")
+        self.assertTrue(fuzzy)
+        self.assertEqual(list(courses.order_by("search_rank"))[0], self.python)
+
+    def test_misspelt_phrase_ranks_closest_course_first(self):
+        courses, _ = search_or_fuzzy(Course.objects.all(), "machne learning")
+        self.assertEqual(list(courses.order_by("search_rank"))[0], self.ml)
+
+    def test_enough_exact_hits_do_not_fall_back(self):
+        more = [CourseFactory(title=f"Python {topic}") for topic in ("Testing", "Packaging")]
+        CourseFactory(title="Pythn Typos")
+        courses, fuzzy = search_or_fuzzy(Course.objects.all(), "python")
+        self.assertFalse(fuzzy)
+        self.assertEqual(set(courses), {self.python, *more})
+
+    def test_few_exact_hits_are_followed_by_similar_courses(self):
+        typo = CourseFactory(title="Pythn Typos", description="Spelling mistakes.")
+        courses, fuzzy = search_or_fuzzy(Course.objects.all(), "python")
+        self.assertTrue(fuzzy)
+        self.assertEqual(list(courses.order_by("search_rank")), [self.python, typo])
+
+    def test_explore_lists_similar_courses_after_a_few_hits(self):
+        cache.clear()
+        typo = CourseFactory(title="Pythn Typos", description="Spelling mistakes.")
+        response = self.client.get("/courses/", {"q": "python"}, HTTP_ACCEPT="text/html")
+        self.assertTrue(response.context["fuzzy"])
+        self.assertEqual(list(response.context["page"].object_list), [self.python, typo])
+
+    def test_candidates_are_bounded(self):
+        with patch("course.search.FUZZY_CANDIDATES", 1):
+            courses = fuzzy_search(Course.objects.all(), "pyhton machne")
+            self.assertEqual(courses.count(), 1)
+
+    def test_candidates_come_from_one_limited_match(self):
+        with CaptureQueriesContext(connection) as queries:
+            fuzzy_search(Course.objects.all(), "pyhton machne learnin")
+        self.assertEqual(len(queries), 1)
+        self.assertIn("ORDER BY rank LIMIT", queries[0]["sql"])
+
+    def test_words_too_short_for_trigrams(self):
+        self.assertFalse(fuzzy_search(Course.objects.all(), "py").exists())
+
+    def test_nonsense_shares_too_few_trigrams(self):
+        CourseFactory(title="Engineering Thinking", description="Learning by building and testing.")
+        self.assertEqual(list(fuzzy_search(Course.objects.all(), "qqqqing")), [])
+
+    def test_typo_ranks_by_overlap_not_by_common_trigrams(self):
+        CourseFactory(
+            title="Distributed Systems Fundamentals",
+            description="Learn machines, learners and earning consensus: learn, learn, learn.",
+        )
+        courses = fuzzy_search(Course.objects.all(), "machne learnin")
+        self.assertEqual(list(courses.order_by("search_rank", "id"))[0], self.ml)
+
+
+class ExploreFacetTest(TestCase):
+    URL = "/courses/"
+
+    def setUp(self):
+        cache.clear()
+        CourseFactory(title="Python for Data", category="data-science")
+        CourseFactory(title="Python Web Apps", category="computer-science")
+        CourseFactory(title="Logo Design", category="design")
+        CourseFactory(title="Python Draft", category="design", status="draft")
+
+    def _counts(self, response):
+        return {c["key"]: c["count"] for c in response.context["categories"]}
+
+    def test_counts_follow_the_search(self):
+        response = self.client.get(self.URL, {"q": "python"}, HTTP_ACCEPT="text/html")
+        counts = self._counts(response)
+        self.assertEqual(counts["data-science"], 1)
+        self.assertEqual(counts["computer-science"], 1)
+        self.assertEqual(counts["design"], 0)
+        self.assertEqual(response.context["result_count"], 2)
+
+    def test_category_filter_keeps_other_facets(self):
+        response = self.client.get(
+            self.URL, {"q": "python", "categories": ["data-science"]}, HTTP_ACCEPT="text/html"
+        )
+        self.assertEqual(self._counts(response)["computer-science"], 1)
+        self.assertEqual(response.context["result_count"], 1)
+        self.assertEqual(len(response.context["page"].object_list), 1)
+
+    def test_facets_and_page_in_two_queries_then_cached(self):
+        # enough hits that no similar courses are looked for
+        CourseFactory(title="Python Testing", category="data-science")
+        with self.assertNumQueries(2):
+            self.client.get(self.URL, {"q": "python"}, HTTP_ACCEPT="text/html")
+        with self.assertNumQueries(1):
+            self.client.get(self.URL, {"q": "  Python "}, HTTP_ACCEPT="text/html")
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = TeacherFactory()
+        student = UserFactory()
+        cls.courses = CourseFactory.create_batch(20, user=teacher)
+        # ties on enrollment count and rating, plus unrated courses
+        for course in cls.courses[:6]:
+            EnrollmentFactory(course=course, user=student)
+            Rating.objects.create(user=student, course=course, rating=4)
+
+    def setUp(self):
+        cache.clear()
+
+    def _walk(self, sort_by):
+        ids, cursor = [], None
+        while True:
+            params = {"sort_by": sort_by}
+            if cursor:
+                params["cursor"] = cursor
+            page = self.client.get("/courses/", params, HTTP_ACCEPT="text/html").context["page"]
+            ids += [course.id for course in page]
+            if not page.has_next():
+                return ids
+            cursor = page.next_cursor
+
+    def test_every_sort_visits_each_course_once(self):
+        for sort_by in ["popular", "rating", "newest"]:
+            ids = self._walk(sort_by)
+            self.assertEqual(sorted(ids), sorted(c.id for c in self.courses), sort_by)
+
+    def test_previous_cursor_returns_previous_page(self):
+        first = self.client.get("/courses/", HTTP_ACCEPT="text/html").context["page"]
+        second = self.client.get(
+            "/courses/", {"cursor": first.next_cursor}, HTTP_ACCEPT="text/html"
+        ).context["page"]
+        back = self.client.get(
+            "/courses/", {"cursor": second.previous_cursor}, HTTP_ACCEPT="text/html"
+        ).context["page"]
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_deep_page_is_one_query_without_offset_or_count(self):
+        first = self.client.get("/courses/", HTTP_ACCEPT="text/html").context["page"]
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/courses/", {"cursor": first.next_cursor}, HTTP_ACCEPT="text/html")
+        sql = " ".join(query["sql"] for query in ctx.captured_queries)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("OFFSET", sql)
+        self.assertNotIn("COUNT(*)", sql)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        response = self.client.get("/courses/", {"cursor": "garbage"}, HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["page"].has_previous())
+
+    def test_api_cursor_mode(self):
+        self.client.force_login(UserFactory(is_staff=True))
+        url = reverse("course_search_api")
+        data = self.client.get(url, {"pagination": "cursor", "sort_by": "rating"}).json()
+        ids = [c["id"] for c in data["results"]]
+        while data["next"]:
+            data = self.client.get(data["next"]).json()
+            ids += [c["id"] for c in data["results"]]
+        self.assertEqual(sorted(ids), sorted(c.id for c in self.courses))
+        self.assertNotIn("count", data)
+
+    def test_courses_without_stats_rows_page_through(self):
+        # as after loaddata or bulk_create, which skip the signals
+        CourseStats.objects.all().delete()
+        self.client.force_login(UserFactory(is_staff=True))
+        data = self.client.get(reverse("course_search_api"), {"pagination": "cursor"}).json()
+        ids = [c["id"] for c in data["results"]]
+        while data["next"]:
+            response = self.client.get(data["next"])
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids += [c["id"] for c in data["results"]]
+        self.assertEqual(sorted(ids), sorted(c.id for c in self.courses))
+
+        first = self.client.get("/courses/", HTTP_ACCEPT="text/html").context["page"]
+        second = self.client.get("/courses/", {"cursor": first.next_cursor}, HTTP_ACCEPT="text/html")
+        self.assertTrue(second.context["page"].has_previous())
+
+    def test_api_bad_cursor_is_404(self):
+        self.client.force_login(UserFactory(is_staff=True))
+        response = self.client.get(reverse("course_search_api"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+
+class CourseStatsTest(TestCase):
+    def setUp(self):
+        self.course = CourseFactory()
+        self.student = UserFactory()
+
+    def _stats(self):
+        return CourseStats.objects.get(course=self.course)
+
+    def test_created_with_course(self):
+        stats = self._stats()
+        self.assertIsNone(stats.avg_rating)
+        self.assertEqual(stats.enrollment_count, 0)
+
+    def test_enrollments_counted_and_uncounted(self):
+        enrollment = EnrollmentFactory(course=self.course)
+        EnrollmentFactory(course=self.course)
+        self.assertEqual(self._stats().enrollment_count, 2)
+        enrollment.delete()
+        self.assertEqual(self._stats().enrollment_count, 1)
+
+    def test_ratings_update_average(self):
+        rating = Rating.objects.create(user=self.student, course=self.course, rating=5)
+        Rating.objects.create(user=UserFactory(), course=self.course, rating=2)
+        self.assertEqual((self._stats().avg_rating, self._stats().rating_count), (3.5, 2))
+        rating.rating = 4
+        rating.save()
+        self.assertEqual(self._stats().avg_rating, 3.0)
+        rating.delete()
+        self.assertEqual((self._stats().avg_rating, self._stats().rating_count), (2.0, 1))
+
+    def test_materials_counted_by_type(self):
+        module = ModuleFactory(course=self.course)
+        MaterialFactory(module=module, type="video")
+        material = MaterialFactory(module=module, type="reading")
+        self.assertEqual((self._stats().video_count, self._stats().reading_count), (1, 1))
+        material.type = "quiz"
+        material.save()
+        self.assertEqual((self._stats().reading_count, self._stats().quiz_count), (0, 1))
+        module.delete()
+        self.assertEqual((self._stats().video_count, self._stats().quiz_count), (0, 0))
+
+    def test_course_delete_cascades(self):
+        EnrollmentFactory(course=self.course)
+        Rating.objects.create(user=self.student, course=self.course, rating=3)
+        MaterialFactory(module=ModuleFactory(course=self.course))
+        self.course.delete()
+        self.assertFalse(CourseStats.objects.exists())
+
+    def test_reconcile_repairs_drift(self):
+        EnrollmentFactory(course=self.course)
+        Rating.objects.create(user=self.student, course=self.course, rating=4)
+        CourseStats.objects.filter(course=self.course).update(enrollment_count=7, avg_rating=None)
+        other = CourseFactory()
+        CourseStats.objects.filter(course=other).delete()
+
+        out = StringIO()
+        call_command("reconcile_course_stats", stdout=out)
+        self.assertIn("1 fixed, 1 created", out.getvalue())
+        stats = self._stats()
+        self.assertEqual((stats.enrollment_count, stats.avg_rating), (1, 4.0))
+        self.assertTrue(CourseStats.objects.filter(course=other).exists())
+
+    def test_explore_reads_stats_without_aggregating(self):
+        cache.clear()
+        EnrollmentFactory(course=self.course)
+        Rating.objects.create(user=self.student, course=self.course, rating=4)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/courses/", {"sort_by": "rating"}, HTTP_ACCEPT="text/html")
+        course = response.context["page"].object_list[0]
+        self.assertEqual((course.avg_rating, course.enrollment_count, course.rating_count), (4.0, 1, 1))
+        page_sql = [q["sql"] for q in ctx.captured_queries if "course_coursestats" in q["sql"]]
+        self.assertEqual(len(page_sql), 1)
+        self.assertNotIn("AVG(", page_sql[0].upper())
+        self.assertNotIn("GROUP BY", page_sql[0].upper())
+
+
+class CourseDetailAggregatesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = CourseFactory()
+        for score in (5, 4, 3):
+            Rating.objects.create(user=UserFactory(), course=cls.course, rating=score)
+        module = ModuleFactory(course=cls.course)
+        for material_type in ("video", "video", "reading", "quiz"):
+            MaterialFactory(module=module, type=material_type)
+        ModuleFactory(course=cls.course)
+
+    def test_page_numbers_are_not_multiplied_by_materials(self):
+        self.client.force_login(UserFactory())
+        response = self.client.get(
+            reverse("course", kwargs={"id": self.course.id}), HTTP_ACCEPT="text/html"
+        )
+        course = response.context["course"]
+        self.assertEqual(course.avg_rating, 4.0)
+        self.assertEqual(course.rating_count, 3)
+        self.assertEqual((course.total_videos, course.total_readings), (2, 1))
+
+    def test_empty_course_counts_zero(self):
+        course = detail_aggregates(Course.objects).get(pk=CourseFactory().pk)
+        self.assertIsNone(course.avg_rating)
+        self.assertEqual((course.rating_count, course.total_videos, course.total_readings), (0, 0, 0))
+
+    def test_api_numbers(self):
+        self.client.force_login(UserFactory(is_staff=True))
+        response = self.client.get(reverse("course_detail_api", kwargs={"id": self.course.id}))
+        self.assertEqual((response.data["avg_rating"], response.data["rating_count"]), (4.0, 3))
+
+    def test_plan_has_no_join_or_group_on_course(self):
+        # sqlite rows are "id parent notused detail"; parent 0 is the outer query
+        plan = detail_aggregates(Course.objects.filter(pk=self.course.pk)).explain()
+        rows = [line.split(" ", 3) for line in plan.splitlines()]
+        top_level = [detail for _, parent, _, detail in rows if parent == "0"]
+        self.assertEqual(top_level[0], "SEARCH course_course USING INTEGER PRIMARY KEY (rowid=?)")
+        self.assertEqual(top_level[1:], [f"CORRELATED SCALAR SUBQUERY {i}" for i in range(1, 5)])
+        self.assertNotIn("SCAN", plan)
+
+
+class WebImportGuardTest(TestCase):
+    HEAVY_MODULES = ("torch", "whisper", "course.tasks")
+
+    def test_asgi_does_not_import_transcription_stack(self):
+        script = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import elearning.asgi\n"
+            "print(round(time.perf_counter() - start, 3))\n"
+            f"print(','.join(m for m in {self.HEAVY_MODULES!r} if m in sys.modules))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        elapsed, loaded = result.stdout.splitlines()[-2:]
+        self.assertEqual(loaded, "", f"elearning.asgi imported {loaded} (startup {elapsed}s)")
+
+    def test_upload_enqueues_by_name(self):
+        with patch("course.jobs.get_backend", return_value=CeleryBackend()), \
+                patch("course.jobs.current_app.send_task") as send_task:
+            enqueue_transcription(42)
+        send_task.assert_called_once_with("course.transcribe", kwargs={"video_id": 42}, priority=0)
+
+
+def _temp_media_root(test):
+    """Point MEDIA_ROOT at a directory removed after ``test``; returns its path."""
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    media_root = override_settings(MEDIA_ROOT=media.name)
+    media_root.enable()
+    test.addCleanup(media_root.disable)
+    return media.name
+
+
+def _fake_whisper(test):
+    """Stand-in whisper module whose model echoes each chunk's length."""
+    whisper = MagicMock(__version__="test")
+    whisper.load_model.return_value.transcribe.side_effect = lambda audio, **options: {
+        "text": f" {len(audio)} ",
+        "segments": [{"start": 0.0, "end": len(audio) / 16000, "text": str(len(audio))}],
+    }
+    # batched decoding: mels stay sample arrays, each decoded as one
+    # timestamped segment whose text is the window's length
+    for step in ("pad_or_trim", "log_mel_spectrogram"):
+        getattr(whisper, step).side_effect = lambda audio, **kwargs: audio
+    whisper.decode.side_effect = lambda model, mel, options: [
+        SimpleNamespace(tokens=[10**9, len(audio), 10**9 + int(len(audio) / 16000 / 0.02)]) for audio in mel
+    ]
+    whisper.tokenizer.get_tokenizer.return_value = SimpleNamespace(
+        timestamp_begin=10**9, decode=lambda tokens: f" {tokens[0]} "
+    )
+    torch = MagicMock()
+    torch.cuda.is_available.return_value = False
+    torch.quantization.quantize_dynamic.side_effect = lambda model, *args, **kwargs: model
+    torch.from_numpy.side_effect = lambda array: array
+    torch.stack.side_effect = lambda mels: SimpleNamespace(to=lambda device: mels)
+    # not patch.dict: restoring all of sys.modules would also unload
+    # course.tasks and leave Celery holding the old module's tasks
+    modules = (("whisper", whisper), ("whisper.tokenizer", whisper.tokenizer), ("torch", torch))
+    for name, module in modules:
+        previous = sys.modules.get(name)
+        sys.modules[name] = module
+        if previous is None:
+            test.addCleanup(sys.modules.pop, name, None)
+        else:
+            test.addCleanup(sys.modules.__setitem__, name, previous)
+    test.addCleanup(transcription._models.clear)
+    test.addCleanup(transcription._load_stats.clear)
+    return whisper
+
+
+def _eager_transcription(test, samples):
+    """Run Celery tasks inline and have "ffmpeg" produce ``samples``."""
+    def extract(source, target):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        samples.astype(np.int16).tofile(target)
+        return len(samples)
+
+    _temp_media_root(test)
+    patcher = patch("course.tasks.extract_audio", extract)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    # put back whatever it was; settings make it True in standalone mode
+    test.addCleanup(setattr, celery_app.conf, "task_always_eager", celery_app.conf.task_always_eager)
+    celery_app.conf.task_always_eager = True
+
+
+class MediaRangeTest(TestCase):
+    def setUp(self):
+        media = _temp_media_root(self)
+        self.content = bytes(range(256)) * 40
+        Path(media, "videos").mkdir()
+        Path(media, "videos", "a.mp4").write_bytes(self.content)
+        self.url = reverse("media", kwargs={"path": "videos/a.mp4"})
+
+    def _get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        return response, b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_whole_file(self):
+        response, body = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+
+    def test_single_range(self):
+        response, body = self._get(Range="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[100:200])
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.content)}")
+
+        response, body = self._get(Range="bytes=-10")
+        self.assertEqual(body, self.content[-10:])
+        response, body = self._get(Range="bytes=10000-")
+        self.assertEqual(body, self.content[10000:])
+
+    def test_multiple_ranges(self):
+        response, body = self._get(Range="bytes=0-9, 50-59, 5-12")
+        self.assertEqual(response.status_code, 206)
+        boundary = response["Content-Type"].split("boundary=")[1]
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges"))
+        self.assertEqual(len(body), int(response["Content-Length"]))
+        parts = body.split(f"--{boundary}".encode())[1:-1]
+        # overlapping ranges are merged
+        self.assertEqual([part.split(b"\r\n\r\n", 1)[1][:-2] for part in parts], [
+            self.content[0:13], self.content[50:60],
+        ])
+        self.assertIn(b"Content-Range: bytes 50-59/10240", parts[1])
+
+    def test_unsatisfiable_and_malformed_ranges(self):
+        response, _ = self._get(Range="bytes=20000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.content)}")
+        response, body = self._get(Range="bytes=9-3")
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_if_range_and_etag(self):
+        etag = self._get()[0]["ETag"]
+        self.assertEqual(self._get(Range="bytes=0-0", **{"If-Range": etag})[0].status_code, 206)
+        self.assertEqual(self._get(Range="bytes=0-0", **{"If-Range": '"stale"'})[0].status_code, 200)
+        self.assertEqual(self._get(**{"If-None-Match": etag})[0].status_code, 304)
+
+    def test_outside_media_root_is_404(self):
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+        self.assertEqual(self.client.get(reverse("media", kwargs={"path": "videos"})).status_code, 404)
+
+    def test_delegates_to_front_proxy(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT="/protected-media/"):
+            response = self.client.get(self.url, headers={"Range": "bytes=0-9"})
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/videos/a.mp4")
+        self.assertEqual(response.content, b"")
+        with override_settings(MEDIA_X_SENDFILE=True):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], str(Path(settings.MEDIA_ROOT, "videos", "a.mp4").resolve()))
+
+
+class WhisperModelRegistryTest(TestCase):
+    def setUp(self):
+        self.whisper = _fake_whisper(self)
+
+    def test_model_loaded_once_across_tasks(self):
+        from .tasks import transcribe
+        _eager_transcription(self, np.full(16000 * 5, 1000))
+        material = MaterialFactory(type="video")
+        video = VideoMaterial.objects.create(material=material, path="videos/a.mp4", content_hash="a")
+        other = VideoMaterial.objects.create(material=material, path="videos/b.mp4", content_hash="b")
+
+        transcribe.apply(kwargs={"video_id": video.id})
+        transcribe.apply(kwargs={"video_id": other.id})
+
+        self.whisper.load_model.assert_called_once_with("base", device="cpu")
+        self.assertEqual(self.whisper.decode.call_count, 2)
+        video.refresh_from_db()
+        self.assertEqual(video.transcript, "80000")
+
+    @override_settings(WHISPER_QUEUE_MODELS={"transcription": "small"})
+    def test_preload_per_queue_and_stats(self):
+        transcription.preload(["transcription", "celery"])
+        self.assertEqual(
+            sorted(call.args[0] for call in self.whisper.load_model.call_args_list),
+            ["base", "small"],
+        )
+        stats = transcription.loaded_models()
+        self.assertEqual(set(stats["models"]), {"base", "small"})
+        self.assertIn("load_seconds", stats["models"]["small"])
+        self.assertGreater(stats["rss_bytes"], 0)
+
+
+class ChunkedTranscriptionTest(TestCase):
+    RATE = 16000
+
+    def _lecture(self, seconds, silences):
+        audio = np.full(seconds * self.RATE, 1000, dtype=np.int16)
+        for at in silences:
+            audio[at * self.RATE:(at + 1) * self.RATE] = 0
+        return audio
+
+    def test_cuts_fall_on_silence_within_bounds(self):
+        audio = self._lecture(600, silences=[150, 400])
+        chunks = transcription.split_on_silence(audio)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual((chunks[0][0], chunks[-1][1]), (0, len(audio)))
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(audio[end], 0)
+
+    def test_short_audio_is_one_chunk(self):
+        self.assertEqual(transcription.split_on_silence(np.zeros(100, dtype=np.int16)), [(0, 100)])
+
+    def test_chunks_stitched_on_the_video_timeline(self):
+        from .tasks import transcribe
+        _fake_whisper(self)
+        _eager_transcription(self, self._lecture(600, silences=[150, 400]))
+        video = VideoMaterial.objects.create(
+            material=MaterialFactory(type="video"), path="videos/a.mp4", content_hash="a"
+        )
+
+        stitched = []
+        def stitch(parts):
+            stitched.append(transcription.stitch(parts))
+            return stitched[-1]
+
+        with patch("course.tasks.stitch", stitch):
+            transcribe.apply(kwargs={"video_id": video.id}).get()
+        segments = stitched[0]["segments"]
+
+        self.assertEqual(len(segments), 3)
+        self.assertEqual(segments[0]["start"], 0.0)
+        for previous, segment in zip(segments, segments[1:]):
+            # only the silence opening the next chunk lies between them
+            self.assertTrue(0 <= segment["start"] - previous["end"] < 1, (previous, segment))
+        self.assertAlmostEqual(segments[-1]["end"], 600.0, places=3)
+        self.assertGreater(stitched[0]["skipped_seconds"], 0)
+        video.refresh_from_db()
+        self.assertEqual(len(video.transcript.split()), 3)
+        self.assertEqual(video.segments, segments)
+        self.assertIsNotNone(video.transcribed_at)
+        self.assertFalse(transcription.audio_path(video.id).exists())
+
+
+class CaptionsTest(TestCase):
+    SEGMENTS = [
+        {"start": 0.0, "end": 2.5, "text": "Welcome back."},
+        {"start": 3661.25, "end": 3662.0, "text": "a --> b\n\nc"},
+    ]
+
+    def setUp(self):
+        self.course = CourseFactory()
+        self.material = MaterialFactory(module=ModuleFactory(course=self.course), type="video")
+        self.video = VideoMaterial.objects.create(
+            material=self.material, path="videos/a.mp4", transcript="SECRET FULL TEXT",
+            segments=self.SEGMENTS, transcribed_at=now(),
+        )
+        self.student = UserFactory()
+        EnrollmentFactory(user=self.student, course=self.course)
+        self.client.force_login(self.student)
+        self.url = reverse("captions", kwargs={"cid": self.course.id, "mid": self.material.id})
+
+    def test_webvtt_format(self):
+        self.assertEqual(
+            to_webvtt(self.SEGMENTS),
+            "WEBVTT\n\n"
+            "00:00:00.000 --> 00:00:02.500\nWelcome back.\n\n"
+            "01:01:01.250 --> 01:01:02.000\na -> b c\n",
+        )
+
+    def test_served_as_cacheable_vtt(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/vtt; charset=utf-8")
+        self.assertIn("private", response["Cache-Control"])
+        self.assertTrue(response.content.startswith(b"WEBVTT"))
+
+        again = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_missing_or_foreign_captions_404(self):
+        other = MaterialFactory(type="video")
+        url = reverse("captions", kwargs={"cid": self.course.id, "mid": other.id})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        VideoMaterial.objects.update(transcribed_at=None, transcript="")
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_page_links_track_instead_of_inlining_transcript(self):
+        response = self.client.get(
+            reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id})
+        )
+        self.assertContains(response, f'<track kind="captions" label="Transcript" src="{self.url}">')
+        self.assertContains(response, '<details id="transcript"')
+        self.assertNotContains(response, "SECRET FULL TEXT")
+
+    def test_untimed_transcript_is_loaded_lazily_too(self):
+        # transcribed before segments were kept
+        VideoMaterial.objects.update(transcribed_at=None, segments=[], duration=75.5)
+        response = self.client.get(
+            reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id})
+        )
+        self.assertContains(response, '<details id="transcript"')
+        self.assertNotContains(response, "SECRET FULL TEXT")
+        self.assertNotContains(response, '<track kind="captions"')
+        self.assertIn("transcript", response.context["video"].get_deferred_fields())
+        self.assertEqual(
+            self.client.get(self.url).content.decode(),
+            "WEBVTT\n\n00:00:00.000 --> 00:01:15.500\nSECRET FULL TEXT\n",
+        )
+
+
+class TranscriptDedupTest(TestCase):
+    def setUp(self):
+        self.owner = TeacherFactory()
+        self.course = CourseFactory(user=self.owner)
+        self.module = ModuleFactory(course=self.course)
+        self.material = MaterialFactory(module=self.module, type="video")
+        self.url = reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id})
+        self.client.force_login(self.owner)
+        _temp_media_root(self)
+
+    def _post(self, **data):
+        with patch("course.views.enqueue_transcription") as enqueue:
+            self.client.post(self.url, {"module_id": self.module.id, "title": "Intro", **data})
+        return enqueue
+
+    def test_upload_hashed_while_streaming(self):
+        content = b"fake mp4 bytes" * 1000
+        enqueue = self._post(path=SimpleUploadedFile("a.mp4", content, "video/mp4"))
+        video = VideoMaterial.objects.get(material=self.material)
+        self.assertEqual(video.content_hash, hashlib.sha256(content).hexdigest())
+        enqueue.assert_called_once_with(video.id)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1000)
+    def test_upload_too_big_for_memory_is_hashed_once(self):
+        content = b"fake mp4 bytes" * 1000
+        sha256 = MagicMock(wraps=hashlib.sha256)
+        with patch("course.uploads.hashlib", SimpleNamespace(sha256=sha256)):
+            self._post(path=SimpleUploadedFile("a.mp4", content, "video/mp4"))
+        # by the temporary file handler only
+        sha256.assert_called_once_with()
+        video = VideoMaterial.objects.get(material=self.material)
+        self.assertEqual(video.content_hash, hashlib.sha256(content).hexdigest())
+
+    def test_edit_without_new_file_keeps_video_and_skips_transcription(self):
+        self._post(path=SimpleUploadedFile("a.mp4", b"bytes", "video/mp4"))
+        VideoMaterial.objects.update(transcribed_at=now())
+        enqueue = self._post(title="Renamed")
+        self.assertEqual(VideoMaterial.objects.get(material=self.material).title, "Renamed")
+        enqueue.assert_not_called()
+
+    def test_cached_transcript_short_circuits(self):
+        from .tasks import transcribe
+        whisper = _fake_whisper(self)
+        _eager_transcription(self, np.full(16000 * 5, 1000))
+        first = VideoMaterial.objects.create(material=self.material, path="videos/a.mp4", content_hash="f" * 64)
+        copy = VideoMaterial.objects.create(material=self.material, path="videos/b.mp4", content_hash="f" * 64)
+
+        transcribe.apply(kwargs={"video_id": first.id})
+        transcribe.apply(kwargs={"video_id": copy.id})
+
+        self.assertEqual(whisper.decode.call_count, 1)
+        self.assertEqual(TranscriptCache.objects.get().model, "base-int8")
+        copy.refresh_from_db()
+        self.assertEqual(copy.transcript, "80000")
+        self.assertIsNotNone(copy.transcribed_at)
+
+
+class CpuInferenceTest(TestCase):
+    def setUp(self):
+        self.whisper = _fake_whisper(self)
+        self.torch = sys.modules["torch"]
+
+    def test_quantized_on_cpu_with_fp16_off(self):
+        transcription.transcribe_samples("base", np.full(16000, 1000, dtype=np.int16), 0)
+        self.torch.quantization.quantize_dynamic.assert_called_once()
+        self.assertEqual(transcription.model_label("base"), "base-int8")
+        _, kwargs = self.whisper.load_model.return_value.transcribe.call_args
+        self.assertEqual(kwargs, {"fp16": False})
+
+    @override_settings(WHISPER_QUANTIZE=False)
+    def test_quantization_can_be_disabled(self):
+        transcription.get_model("base")
+        self.torch.quantization.quantize_dynamic.assert_not_called()
+        self.assertEqual(transcription.model_label("base"), "base")
+
+    def test_threads_shared_across_pool(self):
+        with patch("os.cpu_count", return_value=8), \
+                patch.object(transcription, "_concurrency", 4):
+            self.assertEqual(transcription.thread_count(), 2)
+            transcription.get_model("base")
+        self.torch.set_num_threads.assert_called_with(2)
+        with override_settings(WHISPER_THREADS=3):
+            self.assertEqual(transcription.thread_count(), 3)
+
+    def test_benchmark_reports_real_time_factor(self):
+        from .tasks import benchmark_transcription
+        report = benchmark_transcription.apply(kwargs={"seconds": 2}).get()
+        self.assertEqual(report["audio_seconds"], 2.0)
+        self.assertEqual(report["model"], "base-int8")
+        self.assertAlmostEqual(report["rtf"], report["elapsed"] / 2, places=3)
+
+
+class VoiceActivityTrimTest(TestCase):
+    RATE = 16000
+
+    def setUp(self):
+        self.whisper = _fake_whisper(self)
+
+    def test_silence_cut_out_and_timestamps_remapped(self):
+        # 5s speech, 10s silence, 5s speech
+        audio = np.full(20 * self.RATE, 1000, dtype=np.int16)
+        audio[5 * self.RATE:15 * self.RATE] = 0
+
+        result = transcription.transcribe_samples("base", audio, offset=100)
+
+        self.assertAlmostEqual(result["skipped_seconds"], 9.6, places=1)
+        (fed,), _ = self.whisper.load_model.return_value.transcribe.call_args
+        self.assertEqual(len(fed), len(audio) - int(result["skipped_seconds"] * self.RATE))
+        self.assertEqual(result["segments"][0]["start"], 100.0)
+        self.assertEqual(result["segments"][0]["end"], 120.0)
+
+    def test_timeline_maps_across_gap(self):
+        regions = [(0, 5 * self.RATE), (15 * self.RATE, 20 * self.RATE)]
+        original = transcription._timeline(regions, offset=0)
+        self.assertEqual(original(2.0), 2.0)
+        self.assertEqual(original(5.0), 15.0)
+        self.assertEqual(original(5.0, end=True), 5.0)
+        self.assertEqual(original(7.0), 17.0)
+
+    def test_all_silence_skips_inference(self):
+        result = transcription.transcribe_samples("base", np.zeros(3 * self.RATE, dtype=np.int16), 0)
+        self.assertEqual(result, {"text": "", "segments": [], "skipped_seconds": 3.0})
+        self.whisper.load_model.return_value.transcribe.assert_not_called()
+
+    def test_quiet_pauses_are_kept(self):
+        audio = np.full(4 * self.RATE, 1000, dtype=np.int16)
+        audio[self.RATE:self.RATE + self.RATE // 2] = 0
+        self.assertEqual(transcription.speech_regions(audio), [(0, len(audio))])
+
+
+class TranscriptionQueueTest(TestCase):
+    def setUp(self):
+        self.owner = TeacherFactory()
+        self.course = CourseFactory(user=self.owner)
+        self.module = ModuleFactory(course=self.course)
+
+    def _video(self, course=None, **fields):
+        module = self.module if course is None else ModuleFactory(course=course)
+        return VideoMaterial.objects.create(
+            material=MaterialFactory(module=module, type="video"), path="videos/a.mp4", **fields
+        )
+
+    def test_routed_to_transcription_queue(self):
+        for name in ("course.transcribe", "course.transcribe_chunk", "course.save_transcript"):
+            route = celery_app.amqp.router.route({}, name)
+            self.assertEqual(route["queue"].name, "transcription")
+
+    def test_same_course_backlog_drops_priority(self):
+        videos = [self._video() for _ in range(3)]
+        other = self._video(course=CourseFactory())
+        with patch("course.jobs.get_backend", return_value=CeleryBackend()), \
+                patch("course.jobs.current_app.send_task") as send_task:
+            for video in videos + [other]:
+                enqueue_transcription(video.id)
+        priorities = [call.kwargs["priority"] for call in send_task.call_args_list]
+        self.assertEqual(priorities, [0, 1, 2, 0])
+        self.assertEqual(
+            VideoMaterial.objects.get(id=other.id).transcript_status, VideoMaterial.TranscriptStatus.PENDING
+        )
+
+    def test_status_and_progress_through_a_run(self):
+        from .tasks import transcribe
+        _fake_whisper(self)
+        _eager_transcription(self, np.full(16000 * 400, 1000, dtype=np.int16))
+        video = self._video(content_hash="a")
+
+        transcribe.apply(kwargs={"video_id": video.id})
+
+        video.refresh_from_db()
+        self.assertEqual(video.transcript_status, VideoMaterial.TranscriptStatus.DONE)
+        self.assertEqual((video.transcript_chunks, video.transcript_chunks_done), (2, 2))
+        self.assertEqual(video.transcript_progress, 100)
+
+    def test_redelivered_finished_job_is_a_no_op(self):
+        from .tasks import transcribe
+        video = self._video(transcript_status=VideoMaterial.TranscriptStatus.DONE, transcript="kept")
+        with patch("course.tasks.extract_audio") as extract:
+            transcribe.apply(kwargs={"video_id": video.id})
+        extract.assert_not_called()
+
+    def test_failure_is_recorded(self):
+        from .tasks import transcribe
+        _fake_whisper(self)
+        video = self._video(content_hash="a")
+        with patch("course.tasks.extract_audio", side_effect=OSError("ffmpeg missing")):
+            transcribe.apply(kwargs={"video_id": video.id})
+        video.refresh_from_db()
+        self.assertEqual(video.transcript_status, VideoMaterial.TranscriptStatus.FAILED)
+
+    def test_owner_polls_status(self):
+        video = self._video(
+            transcript_status=VideoMaterial.TranscriptStatus.RUNNING,
+            transcript_chunks=4, transcript_chunks_done=1,
+        )
+        url = reverse("transcript_status", kwargs={"cid": self.course.id, "mid": video.material_id})
+        self.client.force_login(self.owner)
+        with self.assertNumQueries(3):  # session, user, the row
+            response = self.client.get(url)
+        self.assertEqual(response.json(), {"status": "running", "label": "Transcribing", "progress": 25})
+
+        self.client.force_login(UserFactory())
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class BatchedTranscriptionTest(TestCase):
+    def setUp(self):
+        self.whisper = _fake_whisper(self)
+        self.module = ModuleFactory()
+
+    def _clip(self, seconds, content_hash):
+        video = VideoMaterial.objects.create(
+            material=MaterialFactory(module=self.module, type="video"), path="videos/a.mp4",
+            content_hash=content_hash, transcript_status=VideoMaterial.TranscriptStatus.BATCHED,
+        )
+        np.full(16000 * seconds, 1000, dtype=np.int16).tofile(transcription.audio_path(video.id))
+        return video
+
+    def test_waiting_clips_share_decoder_passes(self):
+        from .tasks import transcribe_batch
+        _eager_transcription(self, np.zeros(0))
+        transcription.audio_path(0).parent.mkdir(parents=True)
+        clips = [self._clip(seconds, str(i)) for i, seconds in enumerate([10, 50, 100])]
+
+        with override_settings(WHISPER_BATCH_SIZE=4):
+            self.assertEqual(transcribe_batch.apply().get(), [clip.id for clip in clips])
+
+        # steady tone, so every window is cut at 20 s: 1 + 2 + 5, four to a pass
+        self.assertEqual(self.whisper.decode.call_count, 2)
+        self.whisper.load_model.return_value.transcribe.assert_not_called()
+        self.assertEqual(TranscriptCache.objects.count(), 3)
+        last = VideoMaterial.objects.get(id=clips[-1].id)
+        self.assertEqual(last.transcript_status, VideoMaterial.TranscriptStatus.DONE)
+        self.assertEqual(len(last.segments), 5)
+        self.assertAlmostEqual(last.segments[-1]["end"], 100, delta=0.02)
+        self.assertFalse(transcription.audio_path(last.id).exists())
+
+    def test_short_upload_waits_for_a_batch(self):
+        from .tasks import transcribe
+        _eager_transcription(self, np.full(16000 * 5, 1000))
+        video = VideoMaterial.objects.create(
+            material=MaterialFactory(module=self.module, type="video"), path="videos/a.mp4", content_hash="a"
+        )
+        with patch("course.tasks.transcribe_batch") as batch:
+            transcribe.apply(kwargs={"video_id": video.id})
+        batch.apply_async.assert_called_once_with(countdown=settings.WHISPER_BATCH_WINDOW)
+        video.refresh_from_db()
+        self.assertEqual(video.transcript_status, VideoMaterial.TranscriptStatus.BATCHED)
+
+    def test_batching_can_be_turned_off(self):
+        from .tasks import transcribe
+        # enabled before _eager_transcription's overrides so it is undone after them
+        batching = override_settings(WHISPER_BATCH_SIZE=1)
+        batching.enable()
+        self.addCleanup(batching.disable)
+        _eager_transcription(self, np.full(16000 * 5, 1000))
+        video = VideoMaterial.objects.create(
+            material=MaterialFactory(module=self.module, type="video"), path="videos/a.mp4", content_hash="a"
+        )
+        transcribe.apply(kwargs={"video_id": video.id})
+        self.whisper.decode.assert_not_called()
+        self.assertEqual(VideoMaterial.objects.get(id=video.id).transcript, "80000")
+
+    def test_timestamp_tokens_become_segments(self):
+        tokenizer = SimpleNamespace(timestamp_begin=100, decode=lambda tokens: " ".join(map(str, tokens)))
+        tokens = [100, 1, 2, 150, 150, 3, 300, 4]
+        self.assertEqual(transcription._window_segments(tokenizer, tokens, 60, 10), [
+            {"start": 60.0, "end": 61.0, "text": "1 2"},
+            {"start": 61.0, "end": 64.0, "text": "3"},
+            {"start": 64.0, "end": 70.0, "text": "4"},
+        ])
+
+
+class HlsTranscodeTest(TestCase):
+    def setUp(self):
+        _temp_media_root(self)
+        self.course = CourseFactory()
+        self.material = MaterialFactory(module=ModuleFactory(course=self.course), type="video")
+        self.video = VideoMaterial.objects.create(material=self.material, path="videos/a.mp4")
+
+    @staticmethod
+    def _ffmpeg(command, check):
+        # write what ffmpeg would: a playlist per rung, or the MP4
+        output = Path(command[-1])
+        if "%v" in output.parts:
+            work = output.parent.parent
+            for rung in work.glob("*p"):
+                (rung / "index.m3u8").write_text("#EXTM3U\n")
+            (work / "master.m3u8").write_text("#EXTM3U\n")
+        else:
+            output.write_bytes(b"mp4")
+
+    def _transcode(self, height=720, audio=True):
+        from .tasks import transcode
+        info = {"width": height * 16 // 9, "height": height, "duration": 60.0, "audio": audio}
+        with patch("course.transcoding.probe", return_value=info), \
+                patch("course.transcoding.subprocess.run", side_effect=self._ffmpeg) as run:
+            transcode.apply(kwargs={"video_id": self.video.id})
+        return run
+
+    def test_ladder_skips_rungs_taller_than_the_source(self):
+        self.assertEqual([rung["height"] for rung in transcoding.ladder(720)], [720, 480, 360])
+        self.assertEqual([rung["height"] for rung in transcoding.ladder(240)], [360])
+
+    def test_one_encode_for_every_rung(self):
+        command = transcoding.hls_command("in.mp4", "out", transcoding.ladder(480), audio=False)
+        self.assertEqual(command.count("-i"), 1)
+        self.assertIn("[0:v]split=2[v0][v1];[v0]scale=-2:480[out0];[v1]scale=-2:360[out1]", command)
+        self.assertEqual(command[command.index("-var_stream_map") + 1], "v:0,name:480p v:1,name:360p")
+        self.assertNotIn("a:0", command)
+        self.assertEqual(command[command.index("-force_key_frames") + 1], "expr:gte(t,n_forced*6)")
+
+    def test_renditions_recorded(self):
+        stale = Path(settings.MEDIA_ROOT, "hls", str(self.video.id))
+        stale.mkdir(parents=True)
+        (stale / "old.ts").write_bytes(b"")
+        run = self._transcode(height=720)
+
+        self.assertEqual(run.call_count, 2)
+        self.assertIn("+faststart", run.call_args_list[1].args[0])
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.playlist.name, f"hls/{self.video.id}/master.m3u8")
+        self.assertEqual(self.video.fallback.name, f"hls/{self.video.id}/fallback.mp4")
+        self.assertEqual(
+            [(r["name"], r["bandwidth"]) for r in self.video.renditions],
+            [("720p", 2928000), ("480p", 1496000), ("360p", 896000)],
+        )
+        self.assertFalse((stale / "old.ts").exists())
+        self.assertTrue(Path(settings.MEDIA_ROOT, self.video.renditions[0]["playlist"]).exists())
+
+    def test_replaced_upload_is_not_overwritten(self):
+        def replace(*args, **kwargs):
+            VideoMaterial.objects.filter(id=self.video.id).update(path="videos/b.mp4")
+            return self._ffmpeg(*args, **kwargs)
+
+        from .tasks import transcode
+        info = {"width": 640, "height": 360, "duration": 1.0, "audio": False}
+        with patch("course.transcoding.probe", return_value=info), \
+                patch("course.transcoding.subprocess.run", side_effect=replace):
+            transcode.apply(kwargs={"video_id": self.video.id})
+        self.assertEqual(VideoMaterial.objects.get(id=self.video.id).renditions, [])
+
+    def test_upload_queues_transcoding(self):
+        owner = self.course.user
+        self.client.force_login(owner)
+        with patch("course.views.enqueue_transcription"), patch("course.views.enqueue_transcoding") as enqueue:
+            self.client.post(
+                reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id}),
+                {"module_id": self.material.module_id, "title": "Intro",
+                 "path": SimpleUploadedFile("b.mp4", b"bytes", "video/mp4")},
+            )
+        enqueue.assert_called_once_with(self.video.id)
+        self.video.refresh_from_db()
+        self.assertEqual((self.video.playlist.name, self.video.renditions), ("", []))
+
+    def test_player_streams_hls_with_mp4_fallback(self):
+        self._transcode(height=480)
+        student = UserFactory()
+        EnrollmentFactory(user=student, course=self.course)
+        self.client.force_login(student)
+        response = self.client.get(reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id}))
+        self.assertContains(response, f'data-stream="/media/hls/{self.video.id}/master.m3u8"')
+        self.assertContains(response, f'<source src="/media/hls/{self.video.id}/fallback.mp4" type="video/mp4">')
+        self.assertContains(response, '<option value="360">360p</option>')
+
+        Path(settings.MEDIA_ROOT, "hls", str(self.video.id), "480p", "segment00000.ts").write_bytes(b"ts")
+        segment = self.client.get(f"/media/hls/{self.video.id}/480p/segment00000.ts")
+        self.assertEqual(segment["Content-Type"], "video/mp2t")
+
+
+class VideoPreviewsTest(TestCase):
+    def setUp(self):
+        _temp_media_root(self)
+        self.course = CourseFactory()
+        self.material = MaterialFactory(module=ModuleFactory(course=self.course), type="video")
+        self.video = VideoMaterial.objects.create(material=self.material, path="videos/a.mp4")
+
+    def _previews(self, duration=754.0):
+        from .tasks import video_previews
+        info = {"width": 1280, "height": 720, "codec": "h264", "duration": duration, "audio": True}
+        with patch("course.transcoding.probe", return_value=info), \
+                patch("course.transcoding.subprocess.run",
+                      side_effect=lambda command, check: Path(command[-1]).write_bytes(b"jpg")) as run:
+            video_previews.apply(kwargs={"video_id": self.video.id})
+        self.video.refresh_from_db()
+        return run
+
+    def test_sprite_plan_caps_frames(self):
+        self.assertEqual(
+            transcoding.sprite_plan(60, 1280, 720), {"interval": 5, "frames": 12, "width": 160, "height": 90}
+        )
+        self.assertEqual(transcoding.sprite_plan(3600, 1920, 1080)["frames"], transcoding.SPRITE_MAX_FRAMES)
+
+    def test_thumbnails_point_at_tiles(self):
+        plan = transcoding.sprite_plan(57, 1280, 720)
+        cues = transcoding.thumbnails_vtt(plan, 57, "sprite.jpg").split("\n\n")
+        self.assertEqual(cues[0], "WEBVTT")
+        self.assertEqual(cues[-1], "00:00:55.000 --> 00:00:57.000\nsprite.jpg#xywh=160,90,160,90\n")
+
+    def test_probe_recorded_with_previews(self):
+        run = self._previews()
+        self.assertEqual(run.call_count, 2)
+        self.assertEqual(
+            (self.video.duration, self.video.width, self.video.height, self.video.codec), (754.0, 1280, 720, "h264")
+        )
+        self.assertEqual(self.video.poster.name, f"previews/{self.video.id}/poster.jpg")
+        self.assertTrue(Path(settings.MEDIA_ROOT, self.video.thumbnails.name).exists())
+
+    def test_player_shows_poster_duration_and_scrubber(self):
+        self._previews()
+        student = UserFactory()
+        EnrollmentFactory(user=student, course=self.course)
+        self.client.force_login(student)
+        response = self.client.get(reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id}))
+        self.assertContains(response, f'poster="/media/previews/{self.video.id}/poster.jpg"')
+        self.assertContains(response, f'src="/media/previews/{self.video.id}/thumbnails.vtt"')
+        self.assertContains(response, "12:34", count=2)
+
+    def test_sidebar_durations_in_one_query(self):
+        for seconds in (65, 3725):
+            material = MaterialFactory(module=self.material.module, type="video")
+            VideoMaterial.objects.create(material=material, path="videos/b.mp4", duration=seconds)
+        template = Template("{% load video %}{% video_durations course as durations %}"
+                            "{% for m in materials %}{{ m|duration_of:durations }};{% endfor %}")
+        materials = list(self.material.module.materials.order_by("id"))
+        with self.assertNumQueries(1):
+            rendered = template.render(Context({"course": self.course, "materials": materials}))
+        self.assertEqual(rendered, ";1:05;1:02:05;")
+
+    def test_upload_queues_previews(self):
+        self._previews()
+        self.client.force_login(self.course.user)
+        with patch("course.views.enqueue_transcription"), patch("course.views.enqueue_transcoding"), \
+                patch("course.views.enqueue_previews") as enqueue:
+            self.client.post(
+                reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id}),
+                {"module_id": self.material.module_id, "title": "Intro",
+                 "path": SimpleUploadedFile("b.mp4", b"bytes", "video/mp4")},
+            )
+        enqueue.assert_called_once_with(self.video.id)
+        self.video.refresh_from_db()
+        self.assertEqual((self.video.poster.name, self.video.duration), ("", None))
+
+
+class ImageDerivativesTest(TestCase):
+    def setUp(self):
+        _temp_media_root(self)
+        cache.clear()
+
+    @staticmethod
+    def _photo(size=(2000, 1000)):
+        from PIL import Image
+        exif = Image.Exif()
+        exif[0x0112] = 6  # shown rotated a quarter turn
+        exif[0x010F] = "Camera Maker"
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, "JPEG", exif=exif)
+        return SimpleUploadedFile("photo.jpeg", buffer.getvalue(), "image/jpeg")
+
+    def test_derivatives_resized_upright_without_exif(self):
+        from PIL import Image
+        with patch("course.images.enqueue_image_derivatives"):
+            course = CourseFactory(cover_img=self._photo())
+        manifest = images.generate(course.cover_img.name)
+
+        self.assertEqual([width for width, _ in manifest["jpg"]], [160, 320, 640, 1000])
+        _, smallest = manifest["webp"][0]
+        self.assertEqual(smallest, course.cover_img.name.replace(".jpeg", ".160w.webp"))
+        with Image.open(Path(settings.MEDIA_ROOT, smallest)) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (160, 320)))
+        _, largest = manifest["jpg"][-1]
+        with Image.open(Path(settings.MEDIA_ROOT, largest)) as image:
+            self.assertEqual(image.size, (1000, 2000))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_saving_an_upload_queues_it_once(self):
+        with patch("course.images.enqueue_image_derivatives") as enqueue:
+            course = CourseFactory(cover_img=self._photo())
+            enqueue.assert_called_once_with(course.cover_img.name)
+            images.generate(course.cover_img.name)
+            course.save()
+            CourseFactory()
+        self.assertEqual(enqueue.call_count, 1)
+
+    def test_picture_offers_srcsets_once_made(self):
+        with patch("course.images.enqueue_image_derivatives"):
+            course = CourseFactory(cover_img=self._photo(size=(800, 400)))
+        template = Template('{% load images %}{% picture course.cover_img sizes="50vw" alt=course.title %}')
+        before = template.render(Context({"course": course}))
+        self.assertHTMLEqual(before, f'<img src="{course.cover_img.url}" alt="{course.title}" loading="lazy">')
+
+        images.generate(course.cover_img.name)
+        with patch.object(images, "_on_disk") as on_disk:
+            after = template.render(Context({"course": course}))
+        on_disk.assert_not_called()
+        stem = course.cover_img.url.removesuffix(".jpeg")
+        self.assertInHTML(
+            f'<source type="image/webp" srcset="{stem}.160w.webp 160w, {stem}.320w.webp 320w, '
+            f'{stem}.400w.webp 400w" sizes="50vw">', after,
+        )
+        self.assertIn(f'src="{stem}.400w.jpg" srcset="{stem}.160w.jpg 160w,', after)
+
+    def test_catalog_cards_use_derivatives(self):
+        with patch("course.images.enqueue_image_derivatives"):
+            course = CourseFactory(cover_img=self._photo(size=(640, 480)))
+        images.generate(course.cover_img.name)
+        response = self.client.get("/courses/")
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertNotContains(response, f'src="{course.cover_img.url}"')
+
+    def test_detail_cover_uses_derivatives(self):
+        with patch("course.images.enqueue_image_derivatives"):
+            course = CourseFactory(cover_img=self._photo(size=(640, 480)))
+        images.generate(course.cover_img.name)
+        self.client.force_login(UserFactory())
+        response = self.client.get(reverse("course", kwargs={"id": course.id}))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, 'alt="Course Cover"')
+        self.assertContains(response, 'loading="eager"')
+        self.assertNotContains(response, "images.unsplash.com")
+
+    def test_command_fills_in_existing_uploads(self):
+        with patch("course.images.enqueue_image_derivatives"):
+            done = CourseFactory(cover_img=self._photo(size=(320, 200)))
+            missing = CourseFactory(cover_img=self._photo(size=(320, 200)))
+        images.generate(done.cover_img.name)
+        out = StringIO()
+        with patch("course.management.commands.image_derivatives.generate", wraps=images.generate) as generate:
+            call_command("image_derivatives", stdout=out)
+        generate.assert_called_once_with(missing.cover_img.name)
+        self.assertIn("Made derivatives for 1 images, 0 failed.", out.getvalue())
+
+
+class ResumableUploadTest(TestCase):
+    def setUp(self):
+        _temp_media_root(self)
+        self.course = CourseFactory()
+        self.material = MaterialFactory(module=ModuleFactory(course=self.course), type="video")
+        self.client.force_login(self.course.user)
+        self.data = fake.binary(length=3000)
+
+    def _create(self, material=None, length=None, filename="lecture 1.mp4"):
+        material = material or self.material
+        return self.client.post(
+            reverse("uploads", kwargs={"cid": self.course.id, "mid": material.id}),
+            headers={
+                "Upload-Length": str(len(self.data) if length is None else length),
+                "Upload-Metadata": "filename " + base64.b64encode(filename.encode()).decode(),
+            },
+        )
+
+    def _patch(self, location, offset, piece):
+        return self.client.generic(
+            "PATCH", location, piece, content_type="application/offset+octet-stream",
+            headers={"Upload-Offset": str(offset)},
+        )
+
+    def _finalize(self, location, **fields):
+        return self.client.post(f"{location}/finalize", {"module_id": self.material.module_id, **fields})
+
+    def test_pieces_land_in_place_and_attach_on_finalize(self):
+        form = self.client.get(reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id}))
+        self.assertContains(form, f'const chunkSize = {settings.RESUMABLE_UPLOAD_CHUNK_SIZE};')
+        created = self._create()
+        self.assertEqual(created.status_code, 201)
+        location = created["Location"]
+        upload = ResumableUpload.objects.get()
+        self.assertEqual(upload.name, "videos/lecture_1.mp4")
+
+        self.assertEqual(self._patch(location, 0, self.data[:1000])["Upload-Offset"], "1000")
+        self.assertEqual(self.client.head(location)["Upload-Offset"], "1000")
+        self.assertEqual(self._patch(location, 1000, self.data[1000:])["Upload-Offset"], "3000")
+        with patch("course.views.enqueue_transcription"), patch("course.views.enqueue_transcoding"), \
+                patch("course.views.enqueue_previews") as previews:
+            response = self._finalize(location, title="Week one")
+
+        self.assertRedirects(response, reverse("material", kwargs={"cid": self.course.id, "mid": self.material.id}),
+                             fetch_redirect_response=False)
+        video = VideoMaterial.objects.get(material=self.material)
+        self.assertEqual((video.title, video.path.name), ("Week one", upload.name))
+        self.assertEqual(video.content_hash, hashlib.sha256(self.data).hexdigest())
+        previews.assert_called_once_with(video.id)
+        # attached where it was written, not copied
+        self.assertEqual(list(Path(settings.MEDIA_ROOT, "videos").iterdir()), [Path(video.path.path)])
+        self.assertFalse(ResumableUpload.objects.exists())
+
+    def test_offsets_are_checked(self):
+        location = self._create()["Location"]
+        self._patch(location, 0, self.data[:1000])
+        replayed = self._patch(location, 0, self.data[:1000])
+        self.assertEqual((replayed.status_code, replayed["Upload-Offset"]), (409, "1000"))
+        self.assertEqual(self._patch(location, 1000, self.data[1000:] + b"extra").status_code, 413)
+        wrong_type = self.client.generic("PATCH", location, b"x", content_type="application/octet-stream",
+                                         headers={"Upload-Offset": "1000"})
+        self.assertEqual(wrong_type.status_code, 415)
+        self.assertEqual(self._finalize(location, title="Early").status_code, 409)
+        with override_settings(RESUMABLE_UPLOAD_MAX_SIZE=100):
+            self.assertEqual(self._create().status_code, 413)
+
+    def test_dropped_connection_keeps_what_arrived(self):
+        from django.http.request import UnreadablePostError
+        location = self._create()["Location"]
+        upload = ResumableUpload.objects.get()
+        stream = MagicMock()
+        stream.read.side_effect = [self.data[:1000], UnreadablePostError("connection reset")]
+        with self.assertRaises(UnreadablePostError):
+            uploads.write_piece(upload, stream, 2000)
+        self.assertEqual(self.client.head(location)["Upload-Offset"], "1000")
+
+    def test_hash_rebuilt_when_another_process_took_a_piece(self):
+        location = self._create()["Location"]
+        self._patch(location, 0, self.data[:1000])
+        uploads._hashers.clear()
+        self._patch(location, 1000, self.data[1000:])
+        with patch("course.views.enqueue_transcription"), patch("course.views.enqueue_transcoding"), \
+                patch("course.views.enqueue_previews"):
+            self._finalize(location, title="Week one")
+        video = VideoMaterial.objects.get(material=self.material)
+        self.assertEqual(video.content_hash, hashlib.sha256(self.data).hexdigest())
+
+    def test_reading_file(self):
+        reading = MaterialFactory(module=self.material.module, type="reading")
+        location = self._create(material=reading, filename="../../notes.pdf")["Location"]
+        self._patch(location, 0, self.data)
+        self.client.post(f"{location}/finalize", {
+            "module_id": reading.module_id, "title": "Notes", "text": "Read these before the lecture.",
+        })
+        self.assertEqual(ReadingMaterial.objects.get(material=reading).file.name, "reading_materials/notes.pdf")
+
+    def test_only_the_owner_uploads(self):
+        location = self._create()["Location"]
+        self.client.force_login(UserFactory())
+        self.assertEqual(self._patch(location, 0, self.data).status_code, 404)
+        self.assertEqual(self._create().status_code, 404)
+
+    def test_abandoned_uploads_pruned(self):
+        self._create()
+        upload = ResumableUpload.objects.get()
+        ResumableUpload.objects.update(updated_at=now() - timedelta(days=2))
+        out = StringIO()
+        call_command("prune_uploads", stdout=out)
+        self.assertIn("Pruned 1 abandoned uploads.", out.getvalue())
+        self.assertFalse(Path(settings.MEDIA_ROOT, upload.name).exists())
+
+
+class TaskBackendSettingsTest(TestCase):
+    # the environment docker-compose gives the worker service
+    WORKER_ENV = {
+        "CELERY_BROKER_URL": "redis://redis:6379/1",
+        "CELERY_RESULT_BACKEND": "redis://redis:6379/1",
+    }
+    LOAD = (
+        "import json, django; django.setup(); from django.conf import settings; "
+        "from elearning.celery import app; print(json.dumps([app.conf.task_always_eager, settings.TASK_BACKEND]))"
+    )
+
+    def _load(self, env):
+        inherited = {
+            name: value for name, value in os.environ.items()
+            if name not in ("STANDALONE_MODE", "CELERY_BROKER_URL", "CELERY_RESULT_BACKEND")
+        }
+        output = subprocess.run(
+            [sys.executable, "-c", self.LOAD], cwd=settings.BASE_DIR, check=True, capture_output=True, text=True,
+            env={**inherited, **env, "DJANGO_SETTINGS_MODULE": "elearning.settings"},
+        ).stdout
+        return json.loads(output)
+
+    def test_worker_with_a_broker_is_not_eager(self):
+        self.assertEqual(self._load(self.WORKER_ENV), [False, "course.jobs.CeleryBackend"])
+        self.assertEqual(
+            self._load({**self.WORKER_ENV, "STANDALONE_MODE": "false"}), [False, "course.jobs.CeleryBackend"]
+        )
+
+    def test_standalone_without_a_broker_runs_locally(self):
+        self.assertEqual(self._load({}), [True, "course.jobs.LocalBackend"])
+
+    def test_unacked_tasks_are_not_redelivered_while_running(self):
+        from . import tasks  # noqa: F401 registers them
+        longest = max(
+            task.time_limit or 0 for name, task in celery_app.tasks.items() if name.startswith("course.")
+        )
+        self.assertGreaterEqual(longest, 2 * 60 * 60)
+        self.assertGreater(settings.CELERY_BROKER_TRANSPORT_OPTIONS["visibility_timeout"], longest)
+
+
+class LocalBackendTest(TestCase):
+    def setUp(self):
+        self.backend = LocalBackend(workers=2)
+
+    def test_enqueue_waits_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks, \
+                patch.object(LocalBackend, "start") as start:
+            job = self.backend.enqueue("course.whisper_stats", {}, priority=3)
+            start.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.priority), (BackgroundJob.Status.QUEUED, 3))
+
+    def test_drain_runs_by_priority(self):
+        low = self.backend.enqueue("course.whisper_stats", {}, priority=5)
+        high = self.backend.enqueue("course.whisper_stats", {}, priority=0)
+        claimed = self.backend.claim()
+        self.assertEqual(claimed.id, high.id)
+        self.backend.run(claimed)
+        self.backend.drain()
+        for job in (low, high):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (BackgroundJob.Status.DONE, 1))
+            self.assertIsNotNone(job.finished_at)
+
+    def test_failing_job_is_retried_then_failed(self):
+        job = self.backend.enqueue("course.whisper_stats", {}, priority=0)
+        with patch("course.tasks.loaded_models", side_effect=RuntimeError("no worker")) as stats, \
+                self.assertLogs("course.jobs", "WARNING") as logs:
+            self.backend.drain()
+        self.assertEqual(stats.call_count, LocalBackend.max_attempts)
+        self.assertEqual(logs.output, [
+            f"WARNING:course.jobs:Job {job.id} (course.whisper_stats) failed, attempt {attempt}"
+            for attempt in range(1, LocalBackend.max_attempts + 1)
+        ])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.Status.FAILED, 3))
+        self.assertIn("no worker", job.error)
+
+    def test_failed_chunk_fails_the_transcription(self):
+        whisper = _fake_whisper(self)
+        whisper.load_model.return_value.transcribe.side_effect = RuntimeError("decoder fell over")
+        _eager_transcription(self, np.full(16000 * 10, 1000, dtype=np.int16))
+        video = VideoMaterial.objects.create(
+            material=MaterialFactory(type="video"), path="videos/a.mp4", content_hash="a"
+        )
+        job = self.backend.enqueue("course.transcribe", {"video_id": video.id})
+        # chunked rather than batched
+        with self.settings(WHISPER_BATCH_SIZE=1), self.assertLogs("course.jobs", "WARNING"):
+            self.backend.drain()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.Status.FAILED, 3))
+        self.assertIn("decoder fell over", job.error)
+        video.refresh_from_db()
+        self.assertEqual(video.transcript_status, VideoMaterial.TranscriptStatus.FAILED)
+
+    def test_run_jobs_leaves_jobs_another_process_is_running(self):
+        running = BackgroundJob.objects.create(
+            task="course.whisper_stats", status=BackgroundJob.Status.RUNNING, started_at=now(), attempts=1
+        )
+        abandoned = BackgroundJob.objects.create(
+            task="course.whisper_stats", status=BackgroundJob.Status.RUNNING,
+            started_at=now() - LocalBackend.lease - timedelta(minutes=1), attempts=1,
+        )
+        call_command("run_jobs", stdout=StringIO())
+        running.refresh_from_db()
+        abandoned.refresh_from_db()
+        self.assertEqual(running.status, BackgroundJob.Status.RUNNING)
+        self.assertEqual((abandoned.status, abandoned.attempts), (BackgroundJob.Status.DONE, 2))
+
+    def test_unknown_task_fails_without_retry(self):
+        job = self.backend.enqueue("course.nope", {}, priority=0)
+        self.backend.drain()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.Status.FAILED, 1))
+
+    @override_settings(TASK_BACKEND="course.jobs.LocalBackend")
+    def test_standalone_transcription_is_queued(self):
+        from .jobs import get_backend
+        get_backend.cache_clear()
+        self.addCleanup(get_backend.cache_clear)
+        video = VideoMaterial.objects.create(material=MaterialFactory(type="video"), path="videos/a.mp4")
+        enqueue_transcription(video.id)
+        job = BackgroundJob.objects.get()
+        self.assertEqual((job.task, job.kwargs), ("course.transcribe", {"video_id": video.id}))
+
+
+class TranscribeBackfillTest(TransactionTestCase):
+    # the command transcribes on its own threads, which need committed rows
+    def setUp(self):
+        self.whisper = _fake_whisper(self)
+        _eager_transcription(self, np.full(16000 * 10, 1000, dtype=np.int16))
+        self.module = ModuleFactory()
+
+    def _video(self, **fields):
+        return VideoMaterial.objects.create(
+            material=MaterialFactory(module=self.module, type="video"), path="videos/a.mp4", **fields
+        )
+
+    def _backfill(self, **options):
+        out = StringIO()
+        call_command("transcribe_backfill", stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_duplicates_are_transcribed_once(self):
+        first, copy = self._video(content_hash="a"), self._video(content_hash="a")
+        other = self._video(content_hash="b")
+        output = self._backfill(workers=2)
+        self.assertIn("3 videos without a transcript, 2 distinct files", output)
+        self.assertIn("copied to 1 duplicates", output)
+        self.assertIn("ETA", output)
+        self.assertEqual(TranscriptCache.objects.count(), 2)
+        for video in (first, copy, other):
+            video.refresh_from_db()
+            self.assertEqual(video.transcript_status, VideoMaterial.TranscriptStatus.DONE)
+        self.assertEqual((copy.transcript, copy.segments), (first.transcript, first.segments))
+
+    @override_settings(WHISPER_BATCH_SIZE=1)
+    def test_workers_take_turns_at_inference(self):
+        # whisper's kv-cache hooks sit on the shared model, so two
+        # transcribe() calls must never overlap
+        lock = threading.Lock()
+        inside, most = [0], [0]
+        echo = self.whisper.load_model.return_value.transcribe.side_effect
+
+        def transcribe(audio, **options):
+            with lock:
+                inside[0] += 1
+                most[0] = max(most[0], inside[0])
+            time.sleep(0.05)
+            with lock:
+                inside[0] -= 1
+            return echo(audio, **options)
+
+        self.whisper.load_model.return_value.transcribe.side_effect = transcribe
+        for i in range(3):
+            self._video(content_hash=str(i))
+        self.assertIn("3 transcribed, 0 failed", self._backfill(workers=3))
+        self.assertEqual(most[0], 1)
+
+    def test_failing_transcription_is_counted_not_waited_for(self):
+        self.whisper.load_model.return_value.transcribe.side_effect = RuntimeError("decoder fell over")
+        video = self._video(content_hash="a")
+        with self.settings(WHISPER_BATCH_SIZE=1), \
+                patch("course.management.commands.transcribe_backfill.time.sleep", side_effect=AssertionError):
+            self.assertIn("0 transcribed, 1 failed", self._backfill())
+        video.refresh_from_db()
+        self.assertEqual(video.transcript_status, VideoMaterial.TranscriptStatus.FAILED)
+
+    def test_resumes_past_finished_and_failed_videos(self):
+        self._video(content_hash="a", transcript="kept", transcript_status=VideoMaterial.TranscriptStatus.DONE)
+        failed = self._video(content_hash="b", transcript_status=VideoMaterial.TranscriptStatus.FAILED)
+        self.assertIn("0 distinct files", self._backfill())
+        self.assertIn("1 distinct files", self._backfill(retry_failed=True))
+        failed.refresh_from_db()
+        self.assertEqual(failed.transcript_status, VideoMaterial.TranscriptStatus.DONE)
+
+    def test_resume_restarts_videos_an_interrupted_run_left(self):
+        stuck = self._video(content_hash="a", transcript_status=VideoMaterial.TranscriptStatus.RUNNING)
+        batched = self._video(content_hash="b", transcript_status=VideoMaterial.TranscriptStatus.BATCHED)
+        self.assertIn("0 distinct files", self._backfill(retry_failed=True))
+        self.assertIn("2 transcribed, 0 failed", self._backfill(resume=True))
+        for video in (stuck, batched):
+            video.refresh_from_db()
+            self.assertEqual(video.transcript_status, VideoMaterial.TranscriptStatus.DONE)
+
+    def test_unhashed_video_is_hashed_or_skipped(self):
+        missing = self._video()
+        Path(settings.MEDIA_ROOT, "videos").mkdir()
+        Path(settings.MEDIA_ROOT, "videos", "b.mp4").write_bytes(b"bytes")
+        present = VideoMaterial.objects.create(material=MaterialFactory(module=self.module), path="videos/b.mp4")
+        self.assertIn("1 transcribed, 0 failed", self._backfill())
+        present.refresh_from_db()
+        self.assertEqual(present.content_hash, hashlib.sha256(b"bytes").hexdigest())
+        self.assertEqual(VideoMaterial.objects.get(id=missing.id).transcript_status, VideoMaterial.TranscriptStatus.NONE)
+
+    def test_enqueue_keeps_workers_in_flight(self):
+        videos = [self._video(content_hash=str(i)) for i in range(5)]
+        most = []
+
+        def enqueue(video_id):
+            in_flight = VideoMaterial.objects.filter(
+                transcript_status=VideoMaterial.TranscriptStatus.PENDING
+            ).count()
+            most.append(in_flight + 1)
+            VideoMaterial.objects.filter(id=video_id).update(transcript_status=VideoMaterial.TranscriptStatus.PENDING)
+
+        def settle(seconds):
+            VideoMaterial.objects.filter(transcript_status=VideoMaterial.TranscriptStatus.PENDING).update(
+                transcript_status=VideoMaterial.TranscriptStatus.DONE, transcript="done"
+            )
+
+        with patch("course.management.commands.transcribe_backfill.enqueue_transcription", enqueue), \
+                patch("course.management.commands.transcribe_backfill.time.sleep", settle):
+            output = self._backfill(workers=2, enqueue=True)
+        self.assertEqual(max(most), 2)
+        self.assertIn("5 transcribed, 0 failed", output)
+        self.assertEqual(
+            VideoMaterial.objects.filter(id__in=[v.id for v in videos], transcript="done").count(), 5
+        )
@@ -0,0 +1,218 @@
+import json
+import math
+import shutil
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+
+from .captions import vtt_timestamp
+
+# Worker-only, like course.transcription: runs the ffmpeg in the worker image.
+
+# scrub previews: a frame every SPRITE_INTERVAL seconds, or fewer for long
+# videos so one sheet never holds more than SPRITE_MAX_FRAMES
+SPRITE_INTERVAL = 5
+SPRITE_MAX_FRAMES = 100
+SPRITE_COLUMNS = 10
+SPRITE_WIDTH = 160
+
+
+def probe(source):
+    """
+    Size, codec and duration of ``source``'s first video stream, and
+    whether it has audio.
+    """
+    output = subprocess.run(
+        ["ffprobe", "-v", "error",
+         "-show_entries", "stream=codec_type,codec_name,width,height:format=duration",
+         "-of", "json", str(source)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    info = json.loads(output)
+    video = next(stream for stream in info["streams"] if stream["codec_type"] == "video")
+    return {
+        "width": video["width"],
+        "height": video["height"],
+        "codec": video.get("codec_name", ""),
+        "duration": float(info.get("format", {}).get("duration", 0)),
+        "audio": any(stream["codec_type"] == "audio" for stream in info["streams"]),
+    }
+
+
+def _replace_dir(final, build):
+    """
+    Run ``build`` on a scratch directory beside ``final`` and swap it in
+    when it succeeds, so readers never see a half-written set of files.
+    """
+    work = final.with_name(f"{final.name}.partial")
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir(parents=True)
+    try:
+        build(work)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    shutil.rmtree(final, ignore_errors=True)
+    work.rename(final)
+    return final.relative_to(Path(settings.MEDIA_ROOT)).as_posix()
+
+
+def bits(rate):
+    """``"2800k"`` as bits per second."""
+    scale = {"k": 1000, "M": 1000 ** 2}.get(rate[-1], 1)
+    return int(float(rate.rstrip("kM")) * scale)
+
+
+def ladder(height):
+    """The rungs of HLS_LADDER no taller than the source, or else just the smallest."""
+    rungs = [rung for rung in settings.HLS_LADDER if rung["height"] <= height]
+    return rungs or sorted(settings.HLS_LADDER, key=lambda rung: rung["height"])[:1]
+
+
+def hls_command(source, target, rungs, audio=True):
+    """
+    One ffmpeg run that decodes ``source`` once and encodes every rung into
+    ``target``/<height>p/, plus a master playlist. Keyframes are forced on
+    segment boundaries so all rungs cut at the same times and players can
+    switch between them at any segment.
+    """
+    seconds = settings.HLS_SEGMENT_SECONDS
+    filters = [f"[0:v]split={len(rungs)}" + "".join(f"[v{i}]" for i in range(len(rungs)))]
+    filters += [f"[v{i}]scale=-2:{rung['height']}[out{i}]" for i, rung in enumerate(rungs)]
+    command = [
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", str(source),
+        "-filter_complex", ";".join(filters),
+    ]
+    streams = []
+    for i, rung in enumerate(rungs):
+        rate = rung["video_bitrate"]
+        command += [
+            "-map", f"[out{i}]", f"-c:v:{i}", "libx264", f"-b:v:{i}", rate,
+            f"-maxrate:v:{i}", rate, f"-bufsize:v:{i}", f"{2 * bits(rate)}",
+        ]
+        stream = f"v:{i}"
+        if audio:
+            command += ["-map", "a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", rung["audio_bitrate"]]
+            stream += f",a:{i}"
+        streams.append(f"{stream},name:{rung['height']}p")
+    command += [
+        "-preset", "veryfast", "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{seconds})",
+        "-f", "hls", "-hls_time", str(seconds), "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", str(Path(target, "%v", "segment%05d.ts")),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(streams),
+        str(Path(target, "%v", "index.m3u8")),
+    ]
+    return command
+
+
+def fallback_command(source, target, height):
+    """A single H.264/AAC MP4 with its index up front, so it plays before it has downloaded."""
+    return [
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", str(source),
+        "-vf", f"scale=-2:{height}", "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+        "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", str(target),
+    ]
+
+
+def transcode(video_id, source):
+    """
+    Encode ``source`` as an HLS ladder and a faststart MP4 under
+    MEDIA_ROOT/hls/<video_id>/ and return the VideoMaterial fields
+    describing them. Everything is written beside the live directory and
+    swapped in at the end, so players never see half a ladder.
+    """
+    info = probe(source)
+    rungs = ladder(info["height"])
+
+    def build(work):
+        for rung in rungs:
+            (work / f"{rung['height']}p").mkdir()
+        subprocess.run(hls_command(source, work, rungs, audio=info["audio"]), check=True)
+        height = min(settings.HLS_FALLBACK_HEIGHT, info["height"])
+        subprocess.run(fallback_command(source, work / "fallback.mp4", height - height % 2), check=True)
+
+    relative = _replace_dir(Path(settings.MEDIA_ROOT) / "hls" / str(video_id), build)
+    return {
+        "playlist": f"{relative}/master.m3u8",
+        "fallback": f"{relative}/fallback.mp4",
+        "renditions": [
+            {
+                "name": f"{rung['height']}p",
+                "height": rung["height"],
+                "bandwidth": bits(rung["video_bitrate"]) + (bits(rung["audio_bitrate"]) if info["audio"] else 0),
+                "playlist": f"{relative}/{rung['height']}p/index.m3u8",
+            }
+            for rung in rungs
+        ],
+    }
+
+
+def poster_command(source, target, seconds):
+    return [
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-ss", f"{seconds:.3f}", "-i", str(source),
+        "-frames:v", "1", "-vf", f"scale=-2:'min({settings.HLS_FALLBACK_HEIGHT},ih)'", "-q:v", "3",
+        str(target),
+    ]
+
+
+def sprite_plan(duration, width, height):
+    """Frame interval, frame count and tile size of the scrub preview sheet."""
+    interval = max(SPRITE_INTERVAL, duration / SPRITE_MAX_FRAMES)
+    frames = max(1, math.ceil(duration / interval))
+    tile_height = round(SPRITE_WIDTH * height / width / 2) * 2
+    return {"interval": interval, "frames": frames, "width": SPRITE_WIDTH, "height": tile_height}
+
+
+def sprite_command(source, target, plan):
+    rows = math.ceil(plan["frames"] / SPRITE_COLUMNS)
+    return [
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", str(source),
+        "-vf", f"fps=1/{plan['interval']},scale={plan['width']}:{plan['height']},tile={SPRITE_COLUMNS}x{rows}",
+        "-frames:v", "1", "-q:v", "5", str(target),
+    ]
+
+
+def thumbnails_vtt(plan, duration, sprite):
+    """A WebVTT cue per frame of the sheet, pointing at its tile with a ``#xywh`` fragment."""
+    cues = ["WEBVTT", ""]
+    for i in range(plan["frames"]):
+        start = i * plan["interval"]
+        end = min(duration, start + plan["interval"])
+        x = i % SPRITE_COLUMNS * plan["width"]
+        y = i // SPRITE_COLUMNS * plan["height"]
+        cues += [
+            f"{vtt_timestamp(start)} --> {vtt_timestamp(end)}",
+            f"{sprite}#xywh={x},{y},{plan['width']},{plan['height']}",
+            "",
+        ]
+    return "\n".join(cues)
+
+
+def previews(video_id, source):
+    """
+    Probe ``source`` and write its poster, scrub preview sprite sheet and
+    the sheet's VTT index under MEDIA_ROOT/previews/<video_id>/. Returns
+    the VideoMaterial fields describing them.
+    """
+    info = probe(source)
+    plan = sprite_plan(info["duration"], info["width"], info["height"])
+
+    def build(work):
+        subprocess.run(poster_command(source, work / "poster.jpg", min(10, info["duration"] / 10)), check=True)
+        subprocess.run(sprite_command(source, work / "sprite.jpg", plan), check=True)
+        # relative to the VTT, which sits beside the sheet
+        (work / "thumbnails.vtt").write_text(thumbnails_vtt(plan, info["duration"], "sprite.jpg"))
+
+    relative = _replace_dir(Path(settings.MEDIA_ROOT) / "previews" / str(video_id), build)
+    return {
+        "duration": info["duration"],
+        "width": info["width"],
+        "height": info["height"],
+        "codec": info["codec"],
+        "poster": f"{relative}/poster.jpg",
+        "thumbnails": f"{relative}/thumbnails.vtt",
+    }
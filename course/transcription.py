@@ -0,0 +1,375 @@
+import os
+import time
+import logging
+import resource
+import threading
+import subprocess
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Worker-only. Loaded models live for the lifetime of the worker process, so
+# back-to-back tasks only pay for inference.
+_models = {}
+_load_stats = {}
+# prefork children per worker; set by course.tasks from celeryd_after_setup
+_concurrency = 1
+# whisper hangs its kv-cache off hooks on the model's own modules while it
+# decodes, so threads sharing a loaded model (LocalBackend workers,
+# transcribe_backfill --workers) would read each other's keys and values;
+# they take turns at inference instead
+_inference = threading.Lock()
+
+
+def model_for_queue(queue):
+    return settings.WHISPER_QUEUE_MODELS.get(queue, settings.WHISPER_MODEL)
+
+
+def resident_memory():
+    """Current RSS in bytes, falling back to the peak where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def thread_count():
+    """
+    Torch threads per worker process. Several prefork children each using
+    every core oversubscribe the CPU, so by default the cores are shared out.
+    """
+    if settings.WHISPER_THREADS:
+        return settings.WHISPER_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, _concurrency))
+
+
+def _plain_linears(module):
+    # whisper's Linear subclass only casts weights to the input dtype, which
+    # doesn't matter in fp32, but quantize_dynamic matches exact types
+    import torch
+
+    for child_name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            linear.weight, linear.bias = child.weight, child.bias
+            setattr(module, child_name, linear)
+        else:
+            _plain_linears(child)
+    return module
+
+
+def load(name):
+    """
+    Load whisper model ``name`` for inference on this host: on CPU the
+    linear layers are quantized to int8, which is most of whisper's compute.
+    """
+    import torch
+    import whisper
+
+    torch.set_num_threads(thread_count())
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = whisper.load_model(name, device=device)
+    quantized = device == "cpu" and settings.WHISPER_QUANTIZE
+    if quantized:
+        model = torch.quantization.quantize_dynamic(
+            _plain_linears(model), {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model, {"device": device, "quantized": quantized, "threads": thread_count()}
+
+
+def get_model(name):
+    """Return the whisper model ``name``, loading it on first use."""
+    if name not in _models:
+        rss_before = resident_memory()
+        start = time.perf_counter()
+        _models[name], config = load(name)
+        _load_stats[name] = {
+            **config,
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "rss_bytes": resident_memory() - rss_before,
+        }
+        logger.info(
+            "Loaded whisper model %s in %.2fs (+%d MB RSS, %s)",
+            name, _load_stats[name]["load_seconds"], _load_stats[name]["rss_bytes"] // 2**20, config,
+        )
+    return _models[name]
+
+
+def model_label(name):
+    """``name`` as recorded with a transcript, e.g. ``base-int8``."""
+    get_model(name)
+    return f"{name}-int8" if _load_stats[name]["quantized"] else name
+
+
+def decode_options(name):
+    # whisper defaults to fp16 and only falls back, with a warning, on CPU
+    return {"fp16": _load_stats[name]["device"] == "cuda"}
+
+
+def whisper_version():
+    import whisper
+
+    return getattr(whisper, "__version__", "")
+
+
+def loaded_models():
+    """Load time and memory of every model in this process, plus its total RSS."""
+    return {"models": dict(_load_stats), "rss_bytes": resident_memory()}
+
+
+def preload(queues):
+    for name in sorted({model_for_queue(queue) for queue in queues}):
+        get_model(name)
+
+
+# ---------- long audio ----------
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+# chunks are cut at the quietest frame between these two lengths
+CHUNK_MIN_SECONDS = 120
+CHUNK_MAX_SECONDS = 300
+# a frame is speech when its RMS is above VAD_FLOOR (int16 scale) and
+# VAD_RELATIVE of the chunk's loud (95th percentile) frames; only quiet
+# stretches of at least VAD_MIN_SILENCE_SECONDS are cut out
+VAD_FLOOR = 300
+VAD_RELATIVE = 0.1
+VAD_MIN_SILENCE_SECONDS = 1.0
+VAD_PAD_SECONDS = 0.2
+
+
+def audio_path(video_id):
+    # under MEDIA_ROOT so every worker sharing the media volume can read it
+    return Path(settings.MEDIA_ROOT) / "audio" / f"{video_id}.pcm"
+
+
+def extract_audio(source, target):
+    """
+    Decode ``source`` once into raw mono 16 kHz s16le PCM at ``target``,
+    the format whisper resamples to anyway. Returns the number of samples.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", str(source),
+         "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", str(target)],
+        check=True,
+    )
+    return target.stat().st_size // 2
+
+
+def load_pcm(path):
+    return np.memmap(path, dtype=np.int16, mode="r")
+
+
+def frame_energy(audio, frame, n_frames, block=10000):
+    # RMS per frame, a block at a time so a memmapped lecture is never
+    # converted to float in one piece
+    energy = np.empty(n_frames, dtype=np.float32)
+    for first in range(0, n_frames, block):
+        last = min(first + block, n_frames)
+        frames = np.asarray(audio[first * frame:last * frame], dtype=np.float32)
+        energy[first:last] = np.sqrt(np.mean(frames.reshape(last - first, frame) ** 2, axis=1))
+    return energy
+
+
+def split_on_silence(audio, min_seconds=CHUNK_MIN_SECONDS, max_seconds=CHUNK_MAX_SECONDS):
+    """
+    ``(start, end)`` sample ranges covering ``audio``. Each cut falls on the
+    lowest-energy frame between ``min_seconds`` and ``max_seconds`` into the
+    chunk, so words are not split between two transcriptions.
+    """
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+    energy = frame_energy(audio, frame, n_frames)
+
+    min_frames = int(min_seconds / FRAME_SECONDS)
+    max_frames = int(max_seconds / FRAME_SECONDS)
+    chunks, start = [], 0
+    while n_frames - start > max_frames:
+        window = energy[start + min_frames:start + max_frames]
+        cut = start + min_frames + int(np.argmin(window))
+        chunks.append((start * frame, cut * frame))
+        start = cut
+    chunks.append((start * frame, len(audio)))
+    return chunks
+
+
+def speech_regions(samples):
+    """``(start, end)`` sample ranges of ``samples`` that hold speech."""
+    frame = int(SAMPLE_RATE * FRAME_SECONDS)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [(0, len(samples))] if len(samples) else []
+    energy = frame_energy(samples, frame, n_frames)
+    voiced = energy > max(VAD_FLOOR, VAD_RELATIVE * np.percentile(energy, 95))
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    min_gap = int(VAD_MIN_SILENCE_SECONDS / FRAME_SECONDS)
+    regions = []
+    for start, end in edges.reshape(-1, 2):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    pad = int(VAD_PAD_SECONDS / FRAME_SECONDS)
+    return [
+        (max(0, start - pad) * frame, len(samples) if end + pad >= n_frames else (end + pad) * frame)
+        for start, end in regions
+    ]
+
+
+def _timeline(regions, offset):
+    """
+    Map a time in the speech-only audio back to the chunk's timeline. An end
+    time on a region boundary belongs to the region before the skipped gap.
+    """
+    compact = np.cumsum([0] + [end - start for start, end in regions[:-1]]).tolist()
+
+    def original(seconds, end=False):
+        sample = seconds * SAMPLE_RATE
+        find = bisect_left if end else bisect_right
+        i = max(0, find(compact, sample) - 1)
+        return round((regions[i][0] + sample - compact[i]) / SAMPLE_RATE + offset, 3)
+
+    return original
+
+
+def transcribe_samples(name, samples, offset):
+    """
+    Transcribe the speech in one chunk. Silent stretches are cut out before
+    inference and segment times are mapped back, shifted by ``offset``
+    seconds to the video's timeline.
+    """
+    regions = speech_regions(samples)
+    speech = sum(end - start for start, end in regions)
+    skipped = round((len(samples) - speech) / SAMPLE_RATE, 3)
+    if not regions:
+        return {"text": "", "segments": [], "skipped_seconds": skipped}
+
+    audio = np.concatenate([np.asarray(samples[start:end], dtype=np.float32) for start, end in regions])
+    model = get_model(name)
+    with _inference:
+        result = model.transcribe(audio / 32768.0, **decode_options(name))
+    original = _timeline(regions, offset)
+    return {
+        "text": result["text"].strip(),
+        "segments": [
+            {
+                "start": original(segment["start"]),
+                "end": original(segment["end"], end=True),
+                "text": segment["text"].strip(),
+            }
+            for segment in result.get("segments", [])
+        ],
+        "skipped_seconds": skipped,
+    }
+
+
+def stitch(parts):
+    """Join per-chunk results, already in chunk order, into one transcript."""
+    return {
+        "text": " ".join(part["text"] for part in parts if part["text"]),
+        "segments": [segment for part in parts for segment in part["segments"]],
+        "skipped_seconds": round(sum(part.get("skipped_seconds", 0) for part in parts), 3),
+    }
+
+
+# ---------- short clips ----------
+
+# clips up to this long are batched instead of chunked
+BATCH_CLIP_SECONDS = 300
+# whisper's decoder sees 30 s of audio at a time
+WINDOW_MIN_SECONDS = 20
+WINDOW_MAX_SECONDS = 30
+TIMESTAMP_SECONDS = 0.02
+
+
+def _window_segments(tokenizer, tokens, offset, length):
+    # tokens look like <|0.00|> text <|2.40|><|2.40|> text <|5.00|> ...
+    segments, text, start, last = [], [], None, 0.0
+    for token in tokens:
+        if token < tokenizer.timestamp_begin:
+            text.append(token)
+            continue
+        last = (token - tokenizer.timestamp_begin) * TIMESTAMP_SECONDS
+        if start is None:
+            start = last
+        elif text:
+            segments.append((start, last, text))
+            start, text = None, []
+    if text:
+        # cut off before its closing timestamp
+        segments.append((last if start is None else start, length, text))
+    return [
+        {"start": round(offset + start, 3), "end": round(offset + min(end, length), 3),
+         "text": tokenizer.decode(text).strip()}
+        for start, end, text in segments
+    ]
+
+
+def transcribe_clips(name, clips, batch_size):
+    """
+    Transcribe several short clips together. Each clip is cut at silences
+    into windows of at most 30 s, windows without speech are dropped, and
+    the rest go through the decoder ``batch_size`` padded mel spectrograms
+    at a time. Returns one ``transcribe_samples``-style result per clip.
+    """
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    model = get_model(name)
+    results = [{"text": "", "segments": [], "skipped_seconds": 0.0} for _ in clips]
+    windows = []
+    for i, samples in enumerate(clips):
+        for start, end in split_on_silence(samples, WINDOW_MIN_SECONDS, WINDOW_MAX_SECONDS):
+            if speech_regions(samples[start:end]):
+                windows.append((i, start, np.asarray(samples[start:end], dtype=np.float32) / 32768.0))
+            else:
+                results[i]["skipped_seconds"] += (end - start) / SAMPLE_RATE
+
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages, task="transcribe")
+    options = whisper.DecodingOptions(task="transcribe", **decode_options(name))
+    for first in range(0, len(windows), batch_size):
+        batch = windows[first:first + batch_size]
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audio)), n_mels=model.dims.n_mels)
+            for _, _, audio in batch
+        ]).to(model.device)
+        with _inference:
+            decoded_batch = whisper.decode(model, mel, options)
+        for (i, start, audio), decoded in zip(batch, decoded_batch):
+            results[i]["segments"] += _window_segments(
+                tokenizer, decoded.tokens, start / SAMPLE_RATE, len(audio) / SAMPLE_RATE
+            )
+
+    for result in results:
+        result["text"] = " ".join(segment["text"] for segment in result["segments"] if segment["text"])
+        result["skipped_seconds"] = round(result["skipped_seconds"], 3)
+    return results
+
+
+def benchmark(name, samples):
+    """Time one transcription of ``samples``; RTF below 1 is faster than real time."""
+    get_model(name)
+    audio_seconds = len(samples) / SAMPLE_RATE
+    start = time.perf_counter()
+    transcribe_samples(name, samples, 0)
+    elapsed = time.perf_counter() - start
+    return {
+        "model": model_label(name),
+        **_load_stats[name],
+        "audio_seconds": round(audio_seconds, 3),
+        "elapsed": round(elapsed, 3),
+        "rtf": round(elapsed / audio_seconds, 4) if audio_seconds else None,
+    }
@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db.models.fields.files import FieldFile
+from django.utils.timezone import now
+
+from .models import ReadingMaterial, ResumableUpload, VideoMaterial
+
+
+class Sha256Mixin:
+    """
+    Hash each upload while it streams in, so the file never has to be read
+    back to fingerprint it. The digest ends up on the uploaded file as
+    ``sha256``. Only the handler that keeps the file hashes it; the others
+    pass the chunks on untouched.
+    """
+    keeps_file = True
+
+    def new_file(self, *args, **kwargs):
+        # before super(): the memory handler ends the chain from there
+        self.sha256 = hashlib.sha256() if self.keeps_file else None
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.sha256 is not None:
+            self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None and self.sha256 is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(Sha256Mixin, MemoryFileUploadHandler):
+    @property
+    def keeps_file(self):
+        # set from the request size; too big and the temporary file handler
+        # after this one keeps it
+        return self.activated
+
+
+class HashingTemporaryFileUploadHandler(Sha256Mixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Streaming SHA-256 of a file already on disk."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Resumable uploads, tus-style: the client creates an upload of a known
+# length, PATCHes it in pieces at explicit offsets (asking for the offset
+# with HEAD after a dropped connection) and finalizes it with the rest of
+# the material form. Pieces are written into the file's final place in
+# storage, so finishing never copies a multi-GB file again.
+
+# which file field of a material an upload fills
+UPLOAD_FIELDS = {
+    "video": VideoMaterial._meta.get_field("path"),
+    "reading": ReadingMaterial._meta.get_field("file"),
+}
+BLOCK_SIZE = 1024 * 1024
+# hash state can't be stored, so this process keeps the running hash of
+# the uploads it was last sent a piece of. Uploads whose next piece lands
+# on another process (or after a restart) are hashed from disk at the end.
+HASHERS_KEPT = 64
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def parse_metadata(header):
+    """``Upload-Metadata: filename ZmlsbS5tcDQ=,type dmlkZW8vbXA0`` as a dict."""
+    metadata = {}
+    for pair in filter(None, (part.strip() for part in header.split(","))):
+        key, _, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode() if value else ""
+        except ValueError:
+            continue
+    return metadata
+
+
+def start_upload(user, material, filename, length):
+    """Reserve the file's final name in storage and record the upload."""
+    field = UPLOAD_FIELDS[material.type]
+    # a browser's name for the file, never a path
+    name = field.generate_filename(None, PurePosixPath(filename.replace("\\", "/")).name or "upload")
+    # an empty placeholder, so nothing else is given the same name meanwhile
+    name = default_storage.save(name, ContentFile(b""))
+    return ResumableUpload.objects.create(user=user, material=material, name=name, length=length)
+
+
+def _take_hasher(upload_id, offset):
+    with _hashers_lock:
+        kept = _hashers.pop(upload_id, None)
+    if kept is not None and kept[0] == offset:
+        return kept[1]
+    return hashlib.sha256() if offset == 0 else None
+
+
+def _keep_hasher(upload_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[upload_id] = (offset, hasher)
+        while len(_hashers) > HASHERS_KEPT:
+            _hashers.popitem(last=False)
+
+
+def write_piece(upload, stream, size):
+    """
+    Write up to ``size`` bytes of ``stream`` at the upload's offset and
+    return the new offset. Whatever arrived before a dropped connection is
+    kept, so the client resumes from there rather than from the start of
+    its piece.
+    """
+    start = end = upload.offset
+    hasher = _take_hasher(upload.id, start)
+    try:
+        with default_storage.open(upload.name, "r+b") as file:
+            file.seek(start)
+            while end - start < size:
+                block = stream.read(min(BLOCK_SIZE, size - (end - start)))
+                if not block:
+                    break
+                file.write(block)
+                if hasher is not None:
+                    hasher.update(block)
+                end += len(block)
+    finally:
+        # only if no other request moved the offset in the meantime
+        moved = ResumableUpload.objects.filter(id=upload.id, offset=start).update(offset=end, updated_at=now())
+        if moved and hasher is not None:
+            _keep_hasher(upload.id, end, hasher)
+        upload.offset = end
+    return end
+
+
+def finished_file(upload):
+    """
+    The complete upload as an already-stored file for the material form,
+    carrying its SHA-256 like files from the hashing upload handlers.
+    """
+    field = UPLOAD_FIELDS[upload.material.type]
+    with _hashers_lock:
+        kept = _hashers.pop(upload.id, None)
+    file = FieldFile(None, field, upload.name)
+    if kept is not None and kept[0] == upload.length:
+        file.sha256 = kept[1].hexdigest()
+    else:
+        file.sha256 = file_sha256(default_storage.path(upload.name))
+    return file
+
+
+def discard_upload(upload):
+    with _hashers_lock:
+        _hashers.pop(upload.id, None)
+    default_storage.delete(upload.name)
+    upload.delete()
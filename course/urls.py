@@ -2,6 +2,7 @@ from django.urls import path
 
 from .views import (
     explore, 
+    suggest,
     course_detail, 
     CourseCreateView, 
     MaterialOverviewView, 
@@ -11,6 +12,10 @@ from .views import (
     RatingOverviewView,
     ModuleView,
     MaterialView,
+    ResumableUploadView,
+    finalize_upload,
+    captions,
+    transcript_status,
     marked_as_complete,
     CourseListView,
     CourseDetailView
@@ -18,12 +23,18 @@ from .views import (
 
 urlpatterns = [
     path('courses/', explore),
+    path('courses/suggest/', suggest, name="course_suggest"),
     path('course/new/', CourseCreateView.as_view(), name="create_course"),
     path('course/<int:id>/', course_detail, name="course"),
     path('course/<int:id>/enroll/', enroll, name="enroll"),
     path('course/<int:cid>/material/', MaterialOverviewView.as_view(), name="material_overview"),
     path('course/<int:cid>/material/<int:mid>', MaterialView.as_view(), name="material"),
+    path('course/<int:cid>/material/<int:mid>/captions.vtt', captions, name="captions"),
+    path('course/<int:cid>/material/<int:mid>/transcript/status', transcript_status, name="transcript_status"),
     path('course/<int:cid>/material/<int:mid>/progress', marked_as_complete, name="marked_as_complete"),
+    path('course/<int:cid>/material/<int:mid>/uploads/', ResumableUploadView.as_view(), name="uploads"),
+    path('course/<int:cid>/material/<int:mid>/uploads/<uuid:uid>', ResumableUploadView.as_view(), name="upload"),
+    path('course/<int:cid>/material/<int:mid>/uploads/<uuid:uid>/finalize', finalize_upload, name="finalize_upload"),
     path('course/<int:cid>/module/', ModuleView.as_view(), name="module"),
     path('course/<int:cid>/instructor/', InstructorOverviewView.as_view(), name="instructor_overview"),
     path('course/<int:cid>/student/', StudentOverviewView.as_view(), name="student_overview"),
@@ -1,16 +1,24 @@
-import os
 import json
+import hashlib
 from datetime import date
 
 from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET, require_POST, condition
+from django.contrib.auth.decorators import login_required
 from django.db import connection
-from django.db.models import Q, Avg, Count, Prefetch, Case, When
+from django.core.cache import cache
+from django.db.models import Q, F, Avg, BooleanField, Count, ExpressionWrapper, Prefetch, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.http.request import UnreadablePostError
+from django.urls import reverse
+from django.utils.datastructures import MultiValueDict
 from django.utils.timezone import now
-from django.http import Http404, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.paginator import Paginator
 from rest_framework.decorators import api_view, renderer_classes, permission_classes
 from rest_framework.renderers import TemplateHTMLRenderer
 from rest_framework.permissions import IsAuthenticated
@@ -25,14 +33,21 @@ from drf_yasg import openapi
 from .forms import CourseForm, RatingForm, VideoMaterialForm, ReadingMaterialForm
 from .models import (
     Course, 
+    CourseSearchIndex,
     Enrollment, 
     Instructor, 
     Rating, 
     Module, 
     Material,
-    Progress
+    Progress,
+    ResumableUpload,
+    VideoMaterial,
 )
-from .task import transcribe
+from .jobs import enqueue_previews, enqueue_transcoding, enqueue_transcription
+from .captions import to_webvtt
+from .uploads import UPLOAD_FIELDS, discard_upload, finished_file, parse_metadata, start_upload, write_piece
+from .search import FUZZY_FALLBACK_HITS, search, search_or_fuzzy, with_fuzzy, tokenize, prefix_query
+from .pagination import keyset_page, KeysetPagination
 from .serializers import CourseSearchSerializer, CourseDetailSerializer
 from people.mixin import TeacherRequiredMixin, StudentRequiredMixin, is_owner
 from notification.signals import material_created, enrollment_created
@@ -76,64 +91,104 @@ def is_instructor(course, user):
 
 # =============== courses ==========================
 
+# keyset order for each sort; the trailing id makes every position unique
+SORT_KEYS = {
+    'popular': ['-enrollment_count', '-id'],
+    'rating': ['-rating_sort', '-id'],
+    'newest': ['-created_at', '-id'],
+    'relevance': ['search_rank', 'id'],
+}
+
+def stat_annotations(courses):
+    # read the card numbers from the denormalized course_coursestats row
+    # instead of aggregating ratings and enrollments per request. Courses
+    # loaded or bulk created without signals have no row until
+    # reconcile_course_stats runs; their counts are 0, not a NULL that a
+    # keyset cursor can't encode
+    return courses.annotate(
+        avg_rating=F('stats__avg_rating'),
+        enrollment_count=Coalesce('stats__enrollment_count', 0),
+        rating_count=Coalesce('stats__rating_count', 0),
+    )
+
+def sort_key_annotations(courses, sort_by):
+    # unrated courses have a NULL average, which a keyset can't compare
+    # against; 0 sorts them last just like NULL did
+    if sort_by == 'rating':
+        return courses.annotate(rating_sort=Coalesce('avg_rating', 0.0))
+    return courses
+
+FACET_CACHE_TIMEOUT = 60
+
+def category_facets(courses, query_key):
+    """
+    Number of ``courses`` per category, as one GROUP BY over the matched
+    ids. Cached briefly under the normalized search so paging and sorting
+    through the same results doesn't recount them.
+    """
+    normalized = " ".join(query_key.lower().split())
+    cache_key = "course_facets:" + hashlib.md5(normalized.encode()).hexdigest()
+    counts = cache.get(cache_key)
+    if counts is None:
+        counts = dict(
+            Course.objects
+            .filter(id__in=courses.values('id'))
+            .values_list('category')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        cache.set(cache_key, counts, FACET_CACHE_TIMEOUT)
+    return counts
+
 @swagger_auto_schema(methods=["GET"], auto_schema=None)
 @api_view(['GET'])
 @renderer_classes([TemplateHTMLRenderer])
 def explore(request):
     q = request.GET.get('q', '').strip()
     categories = request.GET.getlist('categories')
-    sort_by = request.GET.get('sort_by', 'popular')
+    scope = request.GET.get('scope', 'course')
+    sort_by = request.GET.get('sort_by') or ('relevance' if q else 'popular')
 
-    courses = Course.objects.filter(status='published')
+    catalog = Course.objects.filter(status='published')
 
-    # query
+    # query + facet counts for the matched set (before the category filter,
+    # so every category shows how many results it would add)
+    fuzzy = False
     if q:
-        words = q.strip().split()
-        fts_query = ' '.join(words[:-1] + [words[-1] + '*']) if words else q
-        
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT rowid
-                FROM courses_fts
-                WHERE courses_fts MATCH %s
-                ORDER BY bm25(courses_fts, 10.0, 1.0)
-            """, [fts_query])
-            ranked_ids = [row[0] for row in cursor.fetchall()]
-        
-        if ranked_ids:
-            preserved_order = Case(
-                *[When(id=pk, then=pos) for pos, pk in enumerate(ranked_ids)]
-            )
-            courses = courses.filter(id__in=ranked_ids).annotate(
-                search_order=preserved_order
-            ).order_by('search_order')
-        else:
-            courses = courses.none()
+        courses = search(catalog, q, scope)
+        category_dict = category_facets(courses, f"{scope}:{q}")
+        # the facets already count the hits
+        if scope == 'course' and sum(category_dict.values()) < FUZZY_FALLBACK_HITS:
+            courses, fuzzy = with_fuzzy(catalog, courses, q)
+            if fuzzy:
+                category_dict = category_facets(courses, f"fuzzy:{q}")
+    else:
+        courses = catalog
+        category_dict = category_facets(courses, "")
 
     # filter
     if categories:
         courses = courses.filter(category__in=categories)
 
-    courses = courses.annotate(
-        avg_rating=Avg('ratings__rating'),
-        enrollment_count=Count('enrollments', distinct=True),
-        rating_count=Count('ratings', distinct=True)
-    )
+    courses = stat_annotations(courses.select_related('user__userprofile'))
 
-    # Sort
-    if sort_by == 'rating':
-        courses = courses.order_by('-avg_rating')
-    elif sort_by == 'newest':
-        courses = courses.order_by('-created_at')
-    elif sort_by == 'popular':
-        courses = courses.order_by('-enrollment_count')
+    # Sort + paginate by keyset: each page is `WHERE (sort key, id) < cursor
+    # LIMIT 9`, so deep pages cost the same as the first one
+    if sort_by not in SORT_KEYS or (sort_by == 'relevance' and not q):
+        sort_by = 'popular'
+    courses = sort_key_annotations(courses, sort_by)
 
-    # Paginate
-    page = Paginator(courses, 9).get_page(request.GET.get("page"))
+    try:
+        page = keyset_page(courses, SORT_KEYS[sort_by], request.GET.get('cursor'), 9)
+    except ValueError:
+        page = keyset_page(courses, SORT_KEYS[sort_by], None, 9)
 
-    total_count = Course.objects.filter(status='published').count()
-    category_counts = Course.objects.filter(status='published').values('category').annotate(count=Count('id'))
-    category_dict = {item['category']: item['count'] for item in category_counts}
+    # the facets already tell us how many rows match
+    total_count = sum(category_dict.values())
+    result_count = (
+        sum(category_dict.get(category, 0) for category in set(categories))
+        if categories else total_count
+    )
 
     # Prepare categories with counts for template
     categories_with_counts = [
@@ -148,30 +203,86 @@ def explore(request):
     return render(request, "courses.html", {
         'page': page,
         'total_count': total_count,
+        'result_count': result_count,
         'categories': categories_with_counts,
         'q': q,
         'selected_categories': categories,
         'sort_by': sort_by,
+        'scope': scope,
+        'fuzzy': fuzzy,
     })
 
+SUGGESTION_LIMIT = 5
+
+# Typeahead for the explore search box. Only reads the FTS index (prefix
+# index + fts5vocab), never the rating/enrollment aggregates, and is public
+# so browsers can reuse answers while the user keeps typing.
+@require_GET
+@cache_control(public=True, max_age=300)
+def suggest(request):
+    words = tokenize(request.GET.get('q', ''))
+    if not words or len(words[-1]) < 2:
+        return JsonResponse({'titles': [], 'terms': []})
+
+    titles = (
+        CourseSearchIndex.objects
+        .filter(document__match=f"title : ({prefix_query(words)})")
+        .order_by('rank')
+        .values('course_id', 'title')[:SUGGESTION_LIMIT]
+    )
+
+    prefix = words[-1]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT term FROM courses_fts_vocab
+            WHERE  term >= %s AND term < %s
+            ORDER  BY doc DESC
+            LIMIT  %s
+            """,
+            [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), SUGGESTION_LIMIT],
+        )
+        terms = [row[0] for row in cursor.fetchall()]
+
+    return JsonResponse({
+        'titles': [{'id': t['course_id'], 'title': t['title']} for t in titles],
+        'terms': terms,
+    })
+
+def _per_course(queryset, course_field, aggregate):
+    # a correlated scalar subquery grouped on the outer course; an empty
+    # group yields no row rather than 0, hence the Coalesce on counts
+    return Subquery(
+        queryset.order_by().values(course_field)
+        .annotate(value=aggregate).values('value')
+    )
+
+def detail_aggregates(courses):
+    """
+    Rating and material totals for the detail page. Each one is its own
+    correlated subquery, so the cost is ratings + materials per course
+    instead of the ratings x materials rows a join across both produces
+    (which also inflated rating_count).
+    """
+    ratings = Rating.objects.filter(course=OuterRef('pk'))
+    materials = Material.objects.filter(module__course=OuterRef('pk'))
+    return courses.annotate(
+        avg_rating=_per_course(ratings, 'course', Avg('rating')),
+        rating_count=Coalesce(_per_course(ratings, 'course', Count('id')), 0),
+        total_videos=Coalesce(
+            _per_course(materials.filter(type='video'), 'module__course', Count('id')), 0
+        ),
+        total_readings=Coalesce(
+            _per_course(materials.filter(type='reading'), 'module__course', Count('id')), 0
+        ),
+    )
+
 @swagger_auto_schema(methods=["GET"], auto_schema=None)
 @api_view(["GET"])
 @renderer_classes([TemplateHTMLRenderer])
 def course_detail(request, id: int):
     course = get_object_or_404(
-        Course.objects
-        .annotate(
-            avg_rating=Avg("ratings__rating"),
-            rating_count=Count("ratings__rating"),
-            total_videos=Count(
-                "modules__materials",
-                filter=Q(modules__materials__type="video")
-            ),
-            total_readings=Count(
-                "modules__materials",
-                filter=Q(modules__materials__type="reading")
-            ),
-        )
+        detail_aggregates(Course.objects)
         .prefetch_related(
             Prefetch(
                 "modules",
@@ -292,10 +403,17 @@ class MaterialView(LoginRequiredMixin, View):
                     "course": course,
                     "material": material,
                     "open_module": material.module.id, # type: ignore
+                    "chunk_size": settings.RESUMABLE_UPLOAD_CHUNK_SIZE,
                 })
+            # the transcript is fetched by the page as a caption file, so
+            # don't load it (or its segments) into every render
+            video = material.video.defer("transcript", "segments").annotate( # type: ignore
+                has_transcript=ExpressionWrapper(~Q(transcript=""), output_field=BooleanField())
+            ).first()
             return render(request, "materials/video/video.html", {
                 "course": course,
                 "material": material,
+                "video": video,
                 "open_module": material.module.id, # type: ignore
             })
 
@@ -307,6 +425,7 @@ class MaterialView(LoginRequiredMixin, View):
                     "course": course,
                     "material": material,
                     "open_module": material.module.id, # type: ignore
+                    "chunk_size": settings.RESUMABLE_UPLOAD_CHUNK_SIZE,
                 })
             return render(request, "materials/reading/reading.html", {
                 "course": course,
@@ -314,7 +433,9 @@ class MaterialView(LoginRequiredMixin, View):
                 "open_module": material.module.id, # type: ignore
             })
     
-    def post(self, request, cid: int, mid: int):
+    def post(self, request, cid: int, mid: int, files=None):
+        # files is the finished upload when finalize_upload hands over
+        files = request.FILES if files is None else files
         course = get_object_or_404(Course, id=cid)
         if course.user != request.user:
             return redirect("material_overview", cid=course.id) # type: ignore
@@ -333,26 +454,43 @@ class MaterialView(LoginRequiredMixin, View):
             return redirect("material", cid=course.id, mid=material.id) # type: ignore
         
         if material.type == "video":
-            form = VideoMaterialForm(request.POST, request.FILES)
+            # edit the existing upload rather than adding another copy of it
+            form = VideoMaterialForm(request.POST, files, instance=material.video.first()) # type: ignore
             if form.is_valid():
                 video = form.save(commit=False)
                 video.material = material
+                new_file = "path" in form.changed_data
+                if new_file:
+                    # set by course.uploads while the file streamed in
+                    video.content_hash = getattr(form.cleaned_data["path"], "sha256", "")
+                    # the old upload's renditions and previews; play the
+                    # original until the new ones exist
+                    video.playlist = video.fallback = video.poster = video.thumbnails = ""
+                    video.renditions = []
+                    video.duration = video.width = video.height = None
+                    video.codec = ""
                 video.save()
                 material.due_date = form.cleaned_data["due_date"]
                 material.save()
                 material_created.send(sender=None, mid=material.id) # type: ignore
-                if os.environ.get('STANDALONE_MODE') == "false":
-                    transcribe.delay(video_id=form.instance.id) # type: ignore
+                # a title or due date edit doesn't need the audio transcribed again
+                if new_file or not video.transcribed_at:
+                    enqueue_transcription(form.instance.id) # type: ignore
+                if new_file:
+                    # previews first: they take seconds, the encode minutes
+                    enqueue_previews(form.instance.id) # type: ignore
+                    enqueue_transcoding(form.instance.id) # type: ignore
                 return redirect("material", cid=course.id, mid=material.id) # type: ignore
             return render(request, "materials/video/form.html", {
                 "form": form,
                 "course": course,
                 "material": material,
-                "open_module": material.module.id # type: ignore
+                "open_module": material.module.id, # type: ignore
+                "chunk_size": settings.RESUMABLE_UPLOAD_CHUNK_SIZE,
             })
         
         if material.type == "reading":
-            form = ReadingMaterialForm(request.POST, request.FILES)
+            form = ReadingMaterialForm(request.POST, files)
             if form.is_valid():
                 reading = form.save(commit=False)
                 reading.material = material
@@ -365,7 +503,8 @@ class MaterialView(LoginRequiredMixin, View):
                 "form": form,
                 "course": course,
                 "material": material,
-                "open_module": material.module.id # type: ignore
+                "open_module": material.module.id, # type: ignore
+                "chunk_size": settings.RESUMABLE_UPLOAD_CHUNK_SIZE,
             })
         
         return redirect("material", cid=course.id, mid=material.id) # type: ignore
@@ -379,6 +518,98 @@ class MaterialView(LoginRequiredMixin, View):
         material.delete()
         return JsonResponse({"ok": True})
 
+# ================= resumable uploads ======================
+TUS_HEADERS = {"Tus-Resumable": "1.0.0", "Cache-Control": "no-store"}
+
+class ResumableUploadView(LoginRequiredMixin, View):
+    """
+    Resumable, tus-style upload of a material's video or reading file. POST
+    creates one of ``Upload-Length`` bytes, HEAD tells how many have arrived,
+    PATCH appends a piece at ``Upload-Offset`` and DELETE abandons it. Once
+    complete, ``finalize_upload`` attaches it to the material.
+    """
+    login_url = "login"
+    redirect_field_name = None
+
+    def _upload(self, request, cid, mid, uid):
+        return get_object_or_404(
+            ResumableUpload.objects.select_related("material"),
+            id=uid, material_id=mid, material__module__course_id=cid, user=request.user,
+        )
+
+    def _offset(self, upload, status=204):
+        return HttpResponse(status=status, headers={
+            **TUS_HEADERS, "Upload-Offset": str(upload.offset), "Upload-Length": str(upload.length),
+        })
+
+    def post(self, request, cid: int, mid: int, uid=None):
+        material = get_object_or_404(Material, id=mid, module__course_id=cid, module__course__user=request.user)
+        if material.type not in UPLOAD_FIELDS:
+            raise Http404()
+        try:
+            length = int(request.headers.get("Upload-Length", ""))
+        except ValueError:
+            length = 0
+        if length < 1:
+            return HttpResponse("Upload-Length is required.", status=400, headers=TUS_HEADERS)
+        if length > settings.RESUMABLE_UPLOAD_MAX_SIZE:
+            return HttpResponse("The file is too large.", status=413, headers=TUS_HEADERS)
+
+        filename = parse_metadata(request.headers.get("Upload-Metadata", "")).get("filename", "")
+        upload = start_upload(request.user, material, filename, length)
+        response = self._offset(upload, status=201)
+        response["Location"] = reverse("upload", kwargs={"cid": cid, "mid": mid, "uid": upload.id})
+        return response
+
+    def head(self, request, cid: int, mid: int, uid=None):
+        return self._offset(self._upload(request, cid, mid, uid), status=200)
+
+    def patch(self, request, cid: int, mid: int, uid=None):
+        upload = self._upload(request, cid, mid, uid)
+        if request.content_type != "application/offset+octet-stream":
+            return HttpResponse(status=415, headers=TUS_HEADERS)
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            size = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            return HttpResponse("Upload-Offset and Content-Length are required.", status=400, headers=TUS_HEADERS)
+        if offset != upload.offset:
+            # a retried piece the server already has, or a gap; the client HEADs and resumes
+            return self._offset(upload, status=409)
+        if size > upload.length - upload.offset:
+            return HttpResponse("The piece runs past the end of the upload.", status=413, headers=TUS_HEADERS)
+        try:
+            write_piece(upload, request, size)
+        except UnreadablePostError:
+            # the connection dropped; what arrived is kept
+            return self._offset(upload, status=400)
+        return self._offset(upload)
+
+    def delete(self, request, cid: int, mid: int, uid=None):
+        discard_upload(self._upload(request, cid, mid, uid))
+        return HttpResponse(status=204, headers=TUS_HEADERS)
+
+@login_required(login_url="/login/")
+@require_POST
+def finalize_upload(request, cid: int, mid: int, uid):
+    """
+    Save the material form (title, due date...) with a completed upload as
+    its file. The file is already in place, so nothing is copied.
+    """
+    upload = get_object_or_404(
+        ResumableUpload.objects.select_related("material"),
+        id=uid, material_id=mid, material__module__course_id=cid, user=request.user,
+    )
+    if not upload.complete:
+        return JsonResponse({"error": "The upload is not complete.", "offset": upload.offset}, status=409)
+    field = UPLOAD_FIELDS[upload.material.type]
+    files = MultiValueDict({field.name: [finished_file(upload)]})
+    response = MaterialView.as_view()(request, cid=cid, mid=mid, files=files)
+    if response.status_code == 302:
+        # the material owns the file now
+        upload.delete()
+    return response
+
 # ================= course instructors ======================
 class InstructorOverviewView(LoginRequiredMixin, TeacherRequiredMixin, View):
     login_url = "login"
@@ -455,6 +686,48 @@ class StudentOverviewView(LoginRequiredMixin, View):
         enrollment.delete()
         return JsonResponse({"ok": True})
         
+@login_required(login_url="/login/")
+@require_GET
+def transcript_status(request, cid: int, mid: int):
+    video = (
+        VideoMaterial.objects
+        .filter(material_id=mid, material__module__course_id=cid, material__module__course__user=request.user)
+        .only("transcript_status", "transcript_chunks", "transcript_chunks_done")
+        .order_by("id")
+        .first()
+    )
+    if video is None:
+        raise Http404()
+    return JsonResponse({
+        "status": video.transcript_status,
+        "label": video.get_transcript_status_display(), # type: ignore
+        "progress": video.transcript_progress,
+    })
+
+def _captioned_video(cid, mid):
+    return (
+        VideoMaterial.objects
+        .filter(material_id=mid, material__module__course_id=cid)
+        # transcribed with timings, or a transcript from before there were any
+        .exclude(transcribed_at__isnull=True, transcript="")
+        .order_by("id")
+    )
+
+def _captions_last_modified(request, cid: int, mid: int):
+    return _captioned_video(cid, mid).values_list("transcribed_at", flat=True).first()
+
+@login_required(login_url="/login/")
+@require_GET
+@cache_control(private=True, max_age=3600)
+@condition(last_modified_func=_captions_last_modified)
+def captions(request, cid: int, mid: int):
+    video = _captioned_video(cid, mid).only("segments", "transcript", "duration").first()
+    if video is None:
+        raise Http404()
+    # untimed, so one cue over the whole video
+    segments = video.segments or [{"start": 0, "end": video.duration or 0, "text": video.transcript}]
+    return HttpResponse(to_webvtt(segments), content_type="text/vtt; charset=utf-8")
+
 class RatingOverviewView(LoginRequiredMixin, StudentRequiredMixin, View):
     login_url = "login"
     redirect_field_name = None
@@ -540,10 +813,24 @@ class CourseListView(ListAPIView):
     pagination_class = CoursePagination
     permission_classes = [IsAdminUser]
     
+    @property
+    def paginator(self):
+        # page numbers by default; opaque (sort key, id) cursors on request
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if 'cursor' in params or params.get('pagination') == 'cursor':
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = CoursePagination()
+        return self._paginator
+
     @swagger_auto_schema(
         manual_parameters=[
+            openapi.Parameter('pagination', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Use page numbers or keyset cursors', enum=['page', 'cursor']),
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Opaque cursor from a previous next/previous link'),
             openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Search courses by keyword'),
-            openapi.Parameter('sort_by', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Sort course by', enum=['rating', 'newest', 'popular']),
+            openapi.Parameter('scope', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Search titles/descriptions or course content', enum=['course', 'content']),
+            openapi.Parameter('sort_by', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Sort course by', enum=['relevance', 'rating', 'newest', 'popular']),
         ]
     )
     def get(self, request, *args, **kwargs):
@@ -553,52 +840,21 @@ class CourseListView(ListAPIView):
     def get_queryset(self):
         params = self.request.query_params
         q = params.get('q', '').strip()
-        sort_by = params.get('sort_by', 'popular')
+        scope = params.get('scope', 'course')
+        sort_by = params.get('sort_by') or ('relevance' if q else 'popular')
 
         courses = Course.objects.filter(status='published')
 
         if q:
-            words = q.split()
-            fts_query = ' '.join(words[:-1] + [words[-1] + '*']) if words else q
-
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    """
-                    SELECT rowid FROM courses_fts
-                    WHERE  courses_fts MATCH %s
-                    ORDER  BY bm25(courses_fts, 10.0, 1.0)
-                    """,
-                    [fts_query],
-                )
-                ranked_ids = [row[0] for row in cursor.fetchall()]
+            courses, _ = search_or_fuzzy(courses, q, scope)
 
-            if not ranked_ids:
-                return Course.objects.none()
+        courses = stat_annotations(courses)
 
-            preserved_order = Case(
-                *[When(id=pk, then=pos) for pos, pk in enumerate(ranked_ids)]
-            )
-            courses = (
-                courses
-                .filter(id__in=ranked_ids)
-                .annotate(search_order=preserved_order)
-                .order_by('search_order')
-            )
-
-        courses = courses.annotate(
-            avg_rating       = Avg('ratings__rating'),
-            enrollment_count = Count('enrollments', distinct=True),
-            rating_count     = Count('ratings', distinct=True),
-        )
-
-        if sort_by == 'rating':
-            courses = courses.order_by('-avg_rating')
-        elif sort_by == 'newest':
-            courses = courses.order_by('-created_at')
-        elif sort_by == 'popular':
-            courses = courses.order_by('-enrollment_count')
+        if sort_by not in SORT_KEYS or (sort_by == 'relevance' and not q):
+            sort_by = 'popular'
+        self.keyset_keys = SORT_KEYS[sort_by]
 
-        return courses
+        return sort_key_annotations(courses, sort_by).order_by(*self.keyset_keys)
     
 class CourseDetailView(RetrieveAPIView):
     serializer_class = CourseDetailSerializer
@@ -607,11 +863,7 @@ class CourseDetailView(RetrieveAPIView):
 
     def get_queryset(self):
         return (
-            Course.objects.filter(status='published')
-            .annotate(
-                avg_rating     = Avg('ratings__rating'),
-                rating_count   = Count('ratings', distinct=True),
-            )
+            detail_aggregates(Course.objects.filter(status='published'))
             .prefetch_related(
                 Prefetch(
                     'modules',
@@ -0,0 +1,183 @@
+"""
+Serves uploaded media. Unlike ``django.views.static.serve`` it answers
+``Range`` requests, so seeking in a video only fetches the bytes the player
+asks for, and it can hand the transfer to a front proxy (``X-Accel-Redirect``
+for nginx, ``X-Sendfile`` for Apache or lighttpd) so no Django thread
+streams the file at all.
+"""
+import mimetypes
+import secrets
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+# larger than FileResponse's 4 KB so streaming a video isn't mostly overhead
+BLOCK_SIZE = 256 * 1024
+# more ranges than this, after merging, get the whole file instead
+MAX_RANGES = 16
+# HLS files mimetypes gets wrong or doesn't know everywhere (.ts is Qt Linguist)
+CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+
+class FileRange:
+    """
+    ``length`` bytes of ``file`` from its current position. It keeps
+    ``fileno`` so a WSGI server's ``wsgi.file_wrapper`` can still sendfile
+    it, the Content-Length telling the server where to stop.
+    """
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_ranges(header, size):
+    """
+    Inclusive ``(first, last)`` byte ranges requested by a ``Range`` header,
+    sorted and merged. ``[]`` when none of them can be satisfied, ``None``
+    when the header is malformed and must be ignored.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash or not (first or last) or not (first + last).isdigit():
+            return None
+        if not first:
+            # suffix: the last N bytes
+            if int(last) and size:
+                ranges.append((max(0, size - int(last)), size - 1))
+            continue
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        if first < size:
+            ranges.append((first, min(int(last), size - 1) if last else size - 1))
+
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(last, merged[-1][1]))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def if_range_matches(request, etag, mtime):
+    # a stale If-Range means "send me the whole new file" rather than a part
+    value = request.headers.get("If-Range")
+    if value is None:
+        return True
+    if value.startswith(('"', 'W/"')):
+        return value == etag
+    return parse_http_date_safe(value) == int(mtime)
+
+
+def _multipart(path, ranges, size, content_type, boundary):
+    def part_header(first, last):
+        return (
+            f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Range: bytes {first}-{last}/{size}\r\n\r\n"
+        ).encode()
+
+    def body():
+        with open(path, "rb") as file:
+            for first, last in ranges:
+                yield part_header(first, last)
+                file.seek(first)
+                part = FileRange(file, last - first + 1)
+                while chunk := part.read(BLOCK_SIZE):
+                    yield chunk
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+    length = sum(len(part_header(first, last)) + last - first + 1 for first, last in ranges)
+    return body(), length + len(f"\r\n--{boundary}--\r\n")
+
+
+def _delegate(path, response):
+    relative = path.relative_to(Path(settings.MEDIA_ROOT).resolve()).as_posix()
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT + quote(relative)
+    else:
+        response["X-Sendfile"] = str(path)
+    return response
+
+
+def serve(request, path):
+    """
+    Serve ``path`` from MEDIA_ROOT with conditional GET, single and multiple
+    byte ranges and ``If-Range``.
+    """
+    try:
+        full_path = Path(safe_join(settings.MEDIA_ROOT, path)).resolve()
+        stat = full_path.stat()
+    except (OSError, SuspiciousFileOperation):
+        raise Http404("Media file not found")
+    if not full_path.is_file():
+        raise Http404("Media file not found")
+
+    etag = quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return not_modified
+
+    content_type = (
+        CONTENT_TYPES.get(full_path.suffix)
+        or mimetypes.guess_type(full_path.name)[0]
+        or "application/octet-stream"
+    )
+    headers = {"ETag": etag, "Last-Modified": http_date(stat.st_mtime), "Accept-Ranges": "bytes"}
+    if settings.MEDIA_ACCEL_REDIRECT or settings.MEDIA_X_SENDFILE:
+        # the proxy does the ranges and the sending
+        return _delegate(full_path, HttpResponse(content_type=content_type, headers=headers))
+
+    size = stat.st_size
+    ranges = None
+    if "Range" in request.headers and request.method == "GET" and if_range_matches(request, etag, stat.st_mtime):
+        ranges = parse_ranges(request.headers["Range"], size)
+    if ranges == []:
+        return HttpResponse(status=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if ranges is not None and len(ranges) > MAX_RANGES:
+        ranges = None
+
+    if ranges is None:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type, headers=headers)
+        response.block_size = BLOCK_SIZE
+    elif len(ranges) == 1:
+        (first, last), = ranges
+        file = open(full_path, "rb")
+        file.seek(first)
+        response = FileResponse(
+            FileRange(file, last - first + 1), status=206, content_type=content_type, headers=headers
+        )
+        response.block_size = BLOCK_SIZE
+        response["Content-Length"] = last - first + 1
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+    else:
+        boundary = secrets.token_hex(16)
+        body, length = _multipart(full_path, ranges, size, content_type, boundary)
+        response = StreamingHttpResponse(
+            body, status=206, content_type=f"multipart/byteranges; boundary={boundary}", headers=headers
+        )
+        response["Content-Length"] = length
+    return response
@@ -147,6 +147,67 @@ USE_TZ = True
 # Celery
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/1')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
+# Without a broker, background tasks are queued in the database and run by
+# threads in the server process (course.jobs.LocalBackend); chords and other
+# follow-up tasks then run inline in those threads. Only when there really
+# is no broker: a Celery worker is given CELERY_BROKER_URL, and running its
+# tasks eagerly would undo the chunk fan-out and the batching window.
+LOCAL_TASKS = STANDALONE_MODE and 'CELERY_BROKER_URL' not in os.environ
+TASK_BACKEND = 'course.jobs.LocalBackend' if LOCAL_TASKS else 'course.jobs.CeleryBackend'
+LOCAL_TASK_WORKERS = int(os.environ.get('LOCAL_TASK_WORKERS', '1'))
+CELERY_TASK_ALWAYS_EAGER = LOCAL_TASKS
+
+# Transcription and video encoding get their own queues so a batch of
+# uploads can't starve the default one; run
+# `celery -A elearning worker -Q transcription,media` for them.
+CELERY_TASK_ROUTES = {
+    'course.transcribe': {'queue': 'transcription'},
+    'course.transcribe_chunk': {'queue': 'transcription'},
+    'course.save_transcript': {'queue': 'transcription'},
+    'course.transcription_failed': {'queue': 'transcription'},
+    'course.transcribe_batch': {'queue': 'transcription'},
+    'course.transcode': {'queue': 'media'},
+    'course.video_previews': {'queue': 'media'},
+    'course.image_derivatives': {'queue': 'media'},
+    'course.benchmark_transcription': {'queue': 'transcription'},
+}
+# priorities 0 (first) to 9 on redis; used to interleave courses.
+# Tasks ack late, and redis hands an unacked task to another worker after
+# visibility_timeout (1h by default), so it has to outlast the longest
+# time_limit (course.transcode's 2h05m) or long encodes run twice at once.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'visibility_timeout': 2 * 60 * 60 + 600,
+}
+# transcriptions run for minutes, so don't let one process hoard several
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Whisper model size, optionally per queue: WHISPER_QUEUE_MODELS="transcription=small,celery=base"
+WHISPER_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+WHISPER_QUEUE_MODELS = dict(
+    item.split('=', 1) for item in os.environ.get('WHISPER_QUEUE_MODELS', '').split(',') if '=' in item
+)
+# int8 dynamic quantization of the linear layers when running on CPU
+WHISPER_QUANTIZE = os.environ.get('WHISPER_QUANTIZE', 'true') == 'true'
+# torch threads per worker process; 0 shares the cores out across the pool
+WHISPER_THREADS = int(os.environ.get('WHISPER_THREADS', '0'))
+# clips of up to 5 minutes are collected for WHISPER_BATCH_WINDOW seconds and
+# decoded WHISPER_BATCH_SIZE windows at a time; a size of 1 turns this off
+WHISPER_BATCH_SIZE = int(os.environ.get('WHISPER_BATCH_SIZE', '8'))
+WHISPER_BATCH_WINDOW = int(os.environ.get('WHISPER_BATCH_WINDOW', '10'))
+
+# HLS renditions made from each uploaded video, tallest first; rungs taller
+# than the upload are skipped
+HLS_LADDER = [
+    {'height': 1080, 'video_bitrate': '5000k', 'audio_bitrate': '128k'},
+    {'height': 720, 'video_bitrate': '2800k', 'audio_bitrate': '128k'},
+    {'height': 480, 'video_bitrate': '1400k', 'audio_bitrate': '96k'},
+    {'height': 360, 'video_bitrate': '800k', 'audio_bitrate': '96k'},
+]
+HLS_SEGMENT_SECONDS = 6
+# the single-file MP4 for players without HLS
+HLS_FALLBACK_HEIGHT = 720
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
@@ -156,3 +217,19 @@ STATIC_URL = 'static/'
 MEDIA_URL = "/media/"
 
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Media is served by elearning.media, with Range support. Behind nginx, set
+# MEDIA_ACCEL_REDIRECT to an `internal` location aliased to MEDIA_ROOT (e.g.
+# /protected-media/); behind Apache or lighttpd, set MEDIA_X_SENDFILE=true.
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+MEDIA_X_SENDFILE = os.environ.get('MEDIA_X_SENDFILE', 'false') == 'true'
+
+# the default handlers, plus a SHA-256 of every upload taken as it streams in
+FILE_UPLOAD_HANDLERS = [
+    "course.uploads.HashingMemoryFileUploadHandler",
+    "course.uploads.HashingTemporaryFileUploadHandler",
+]
+
+# Material files go up in resumable pieces of this size (course.uploads)
+RESUMABLE_UPLOAD_CHUNK_SIZE = int(os.environ.get('RESUMABLE_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+RESUMABLE_UPLOAD_MAX_SIZE = int(os.environ.get('RESUMABLE_UPLOAD_MAX_SIZE', str(20 * 1024 ** 3)))
@@ -17,7 +17,6 @@ Including another URLconf
 from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
 from rest_framework.authentication import SessionAuthentication
@@ -25,6 +24,8 @@ from rest_framework.authentication import SessionAuthentication
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view as get_swagger_schema_view
 
+from elearning import media
+
 schema_view = get_swagger_schema_view(
     openapi.Info(
         title="Elearning API",
@@ -45,4 +46,5 @@ urlpatterns = [
     path("", include("message.urls")),
     path("", RedirectView.as_view(pattern_name="dashboard", permanent=False)),
     path("docs/", schema_view.with_ui("swagger", cache_timeout=10), name="docs"),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", media.serve, name="media"),
+]
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from rest_framework.pagination import PageNumberPagination
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Avg
+from django.db.models import Q, F
 
 from course.models import Course
 from .models import Status, UserProfile
@@ -56,5 +56,5 @@ class UserProfileSerializer(serializers.ModelSerializer):
             Q(user=user) |
             Q(enrollments__user=user) |
             Q(instructors__user=user)
-        ).annotate(avg_rating=Avg("ratings__rating")).distinct()
+        ).annotate(avg_rating=F("stats__avg_rating")).distinct()
         return CourseSerializer(courses, many=True).data
\ No newline at end of file
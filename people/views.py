@@ -15,7 +15,7 @@ from django.core.paginator import Paginator
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Avg
+from django.db.models import Q, F
 from django.utils import timezone
 from django.views import View
 from drf_yasg.utils import swagger_auto_schema
@@ -48,7 +48,7 @@ def dashboard(request):
         Q(user=request.user) |                          # Own course 
         Q(enrollments__user=request.user) |             # Enrolled course
         Q(instructors__user=request.user)               # Instructor cause
-    ).annotate(avg_rating=Avg("ratings__rating")).distinct()
+    ).annotate(avg_rating=F("stats__avg_rating")).distinct()
     
     deadlines = Material.objects.filter(
         module__course__enrollments__user=request.user,
@@ -98,7 +98,7 @@ def profile(request, id: int):
         Q(user=user) |                          # Own course 
         Q(enrollments__user=user) |             # Enrolled course
         Q(instructors__user=user)               # Instructor course
-    ).annotate(avg_rating=Avg("ratings__rating")).distinct()
+    ).annotate(avg_rating=F("stats__avg_rating")).distinct()
     
     paginator = Paginator(Status.objects.filter(user=user).order_by("-created_at"), 5)
     page_number = request.GET.get("page")